@@ -0,0 +1,282 @@
+"""
+Headless HTTP API for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+ASGI service exposing ingest, search and answer endpoints over
+EnhancedVectorStore, pdf_utils and the LLM backends, so the pipeline can be
+integrated and load-tested without a Streamlit session.
+
+Each worker process opens the saved index read-only and memory-mapped where
+the index type allows it, and reloads it when another worker ingests a new
+document. Concurrent query embeddings within a worker are micro-batched
+into a single model.encode call (see embedding_batcher).
+
+Usage:
+    python api_server.py --workers 4
+    uvicorn api_server:app --workers 4 --port 8000
+"""
+
+import argparse
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from config import Config
+from conversation_store import Conversation, get_conversation_store
+from pdf_utils import (OCR_AVAILABLE, chunk_text_with_offsets, extract_pages_from_pdf, extract_text_from_image_file,
+                       join_pages, page_word_starts, upload_source)
+from rag_request import RAGRequest
+from search_filter import SearchFilter
+from summarizer import is_whole_document_question
+from profiling import profile_run
+from telemetry import prometheus_text, registry, trace
+from vector_store import EnhancedVectorStore, query_batcher_metrics, stored_version
+
+if Config.LLM_BACKEND == 'openai':
+    from cloud_rag import analyze_document_content, ask_smart_llm, summarize_document
+else:
+    from gemini_rag import analyze_document_content, ask_smart_llm, summarize_document
+
+class FilterSpec(BaseModel):
+    """Restrict retrieval to chunks with these flags, pages or documents (see search_filter)"""
+    require: List[str] = []
+    prefer: List[str] = []
+    pages: Optional[Tuple[int, int]] = None
+    document_ids: Optional[List[str]] = None  # as reported by /ingest
+
+    def compile(self) -> SearchFilter:
+        try:
+            return SearchFilter.create(self.require, self.prefer, self.pages, self.document_ids)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=Config.MAX_SEARCH_RESULTS)
+    filter: Optional[FilterSpec] = None
+
+class AnswerRequest(BaseModel):
+    question: str
+    top_k: int = Field(5, ge=1, le=Config.MAX_SEARCH_RESULTS)
+    filter: Optional[FilterSpec] = None
+    history: List[Tuple[str, str]] = []
+    conversation_id: Optional[str] = None  # server-side history instead of 'history'; the exchange is stored
+    temperature: Optional[float] = None
+
+class SearchHit(BaseModel):
+    chunk: str
+    score: float
+    metadata: dict
+
+class _StoreState:
+    """The worker's current read-only store, replaced when a new index snapshot is saved.
+
+    A new snapshot is loaded into a fresh store by one request while the
+    others keep searching the old one; the swap is a single assignment, so
+    in-flight queries finish on the data they started with.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.store = None
+        self.version = None
+        self.checked_at = 0.0
+        self.document_metadata = None
+
+    def get(self) -> EnhancedVectorStore:
+        store = self.store
+        now = time.monotonic()
+        if store is not None and now - self.checked_at < Config.SNAPSHOT_POLL_SECONDS:
+            return store
+        self.checked_at = now
+        version = stored_version(Config.INDEX_PATH)
+        if store is not None and version == self.version:
+            return store
+        if version is None:
+            raise HTTPException(status_code=409, detail="No document has been ingested yet")
+
+        # Only the first cold start waits; later reloads serve the old store meanwhile
+        if not self.lock.acquire(blocking=store is None):
+            return store
+        try:
+            if self.store is None or self.version != version:
+                new_store = EnhancedVectorStore(Config.EMBEDDING_MODEL, index_path=Config.INDEX_PATH)
+                new_store.load(mmap=True, version=version if isinstance(version, str) else None)
+                document_metadata = analyze_document_content(new_store.chunks) if new_store.chunks else None
+                old_store = self.store
+                self.store, self.version, self.document_metadata = new_store, version, document_metadata
+                if old_store is not None:
+                    old_store.close()
+        except Exception as e:
+            if store is None:
+                raise
+            print(f"Could not load index version {version}, still serving {self.version}: {e}")
+        finally:
+            self.lock.release()
+        return self.store
+
+    def replace(self, store: EnhancedVectorStore):
+        with self.lock:
+            if self.store is not None and self.store is not store:
+                self.store.close()
+            self.store = store
+            self.version = store.snapshot_version or stored_version(Config.INDEX_PATH)
+            self.document_metadata = analyze_document_content(store.chunks)
+
+state = _StoreState()
+ingest_lock = threading.Lock()
+
+app = FastAPI(title=f"{Config.APP_NAME} API", version=Config.APP_VERSION)
+
+def _search_hits(results) -> List[SearchHit]:
+    return [SearchHit(chunk=chunk, score=score, metadata=metadata) for chunk, score, metadata in results]
+
+async def _search(query: str, top_k: int, search_filter: SearchFilter = None):
+    # Query embeddings from concurrent requests are micro-batched by the store
+    store = await run_in_threadpool(state.get)
+    return store, await run_in_threadpool(store.enhanced_search, query, top_k, None, search_filter)
+
+@app.get("/health")
+def health():
+    """Liveness check with index status"""
+    store = state.store
+    return {
+        "status": "ok",
+        "version": Config.APP_VERSION,
+        "document_loaded": store is not None and bool(store.chunks),
+        "chunks": len(store.chunks) if store is not None else 0,
+        "query_batching": query_batcher_metrics(Config.EMBEDDING_MODEL),
+        "query_cache": store.cache_stats() if store is not None else None,
+        "index_memory": store.memory_report() if store is not None else None,
+    }
+
+def _ingest_file(source, file_name: str, content_type: str) -> EnhancedVectorStore:
+    with profile_run('ingest'):
+        return _extract_and_index(source, file_name, content_type)
+
+def _extract_and_index(source, file_name: str, content_type: str) -> EnhancedVectorStore:
+    page_starts = None
+    if content_type == "application/pdf" or file_name.lower().endswith(".pdf"):
+        pages = extract_pages_from_pdf(source, use_ocr=OCR_AVAILABLE)
+        text, page_starts = join_pages(pages), page_word_starts(pages)
+    elif OCR_AVAILABLE:
+        text = extract_text_from_image_file(source)
+    else:
+        raise HTTPException(status_code=415, detail="OCR not available. Cannot process image files.")
+
+    if not text.strip() or text.startswith("OCR not available") or text.startswith("OCR Error"):
+        raise HTTPException(status_code=422, detail="No text could be extracted from the file.")
+
+    chunked = chunk_text_with_offsets(text, chunk_size=Config.CHUNK_SIZE, overlap=Config.CHUNK_OVERLAP)
+    chunks = [chunk for chunk, start, end in chunked]
+
+    store = EnhancedVectorStore(Config.EMBEDDING_MODEL, index_path=Config.INDEX_PATH)
+    store.add_chunks(chunks, [(start, end) for chunk, start, end in chunked], page_starts)
+    with ingest_lock:
+        store.save()
+    return store
+
+@app.post("/ingest")
+async def ingest(file: UploadFile = File(...)):
+    """Extract, chunk, embed and index an uploaded PDF or image"""
+    extension = os.path.splitext(file.filename or "")[1].lower().lstrip('.')
+    if extension not in Config.ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {extension or 'unknown'}")
+
+    data = await file.read()
+    if len(data) > Config.MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    # Extract from memory; only uploads above UPLOAD_SPILL_THRESHOLD go to a temp file
+    with trace('ingest') as ingest_trace, upload_source(data, suffix=f".{extension}") as source:
+        store = await run_in_threadpool(_ingest_file, source, file.filename or "", file.content_type or "")
+
+    state.replace(store)
+    return {"status": "indexed", "file_name": file.filename, **store.get_document_summary(),
+            "timings_ms": ingest_trace.breakdown()}
+
+@app.post("/search", response_model=List[SearchHit])
+async def search(request: SearchRequest):
+    """Semantic search with re-ranking over the ingested document"""
+    _, results = await _search(request.query, request.top_k, request.filter.compile() if request.filter else None)
+    return _search_hits(results)
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    """Answer a question from the ingested document.
+
+    mode is 'whole_document' when the answer was built from every chunk
+    (map-reduce summary); sources are then empty.
+    """
+    with trace('question') as question_trace:
+        results, answer_text, mode = await run_in_threadpool(_answer, request)
+    return {"answer": answer_text, "mode": mode, "sources": _search_hits(results),
+            "timings_ms": question_trace.breakdown(), "conversation_id": request.conversation_id}
+
+def _answer(request: AnswerRequest):
+    # Search and generation run in one worker thread so profiling mode sees both
+    with profile_run('question'):
+        store = state.get()
+        conversation = Conversation(request.conversation_id) if request.conversation_id else None
+        if Config.SUMMARY_MODE and request.filter is None and is_whole_document_question(request.question):
+            # Whole-document questions are answered from every chunk, so there are no top_k sources
+            mode, results = 'whole_document', []
+            answer_text = summarize_document(request.question, store.chunks, store.chunk_metadata)
+        else:
+            mode = 'retrieval'
+            results = store.enhanced_search(request.question, request.top_k,
+                                            search_filter=request.filter.compile() if request.filter else None)
+            rag_request = RAGRequest(
+                question=request.question,
+                chunks=results,
+                history=conversation.prompt_history() if conversation else list(request.history),
+                metadata=state.document_metadata,
+                temperature=request.temperature
+            )
+            answer_text = ask_smart_llm(rag_request)
+        if conversation is not None:
+            conversation.append(request.question, answer_text)
+        return results, answer_text, mode
+
+@app.get("/conversations/{conversation_id}")
+def conversation_turns(conversation_id: str, offset: int = 0, limit: int = Config.HISTORY_PAGE_SIZE):
+    """A page of a stored conversation, oldest first"""
+    store = get_conversation_store()
+    return {"conversation_id": conversation_id, "total": store.count(conversation_id), "offset": offset,
+            "turns": [{"question": question, "answer": answer}
+                      for question, answer in store.turns(conversation_id, offset, min(limit, 500))]}
+
+@app.get("/conversations/{conversation_id}/export")
+def export_conversation(conversation_id: str):
+    """Plain-text export streamed from the conversation store"""
+    if not get_conversation_store().count(conversation_id):
+        raise HTTPException(status_code=404, detail="Unknown or empty conversation")
+    return StreamingResponse(Conversation(conversation_id).export_lines(), media_type="text/plain",
+                             headers={"Content-Disposition": f'attachment; filename="chat_{conversation_id}.txt"'})
+
+@app.get("/metrics")
+def metrics(format: str = "prometheus"):
+    """Pipeline latency histograms (Prometheus text, or JSON with ?format=json)"""
+    if format == "json":
+        return registry.to_dict()
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the RAG Assistant HTTP API")
+    parser.add_argument('--host', default=Config.API_HOST)
+    parser.add_argument('--port', type=int, default=Config.API_PORT)
+    parser.add_argument('--workers', type=int, default=Config.API_WORKERS)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Performance benchmarks for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Usage:
+    python benchmark.py embedding                       # synthetic chunks
+    python benchmark.py embedding --pdf report.pdf      # chunks of a real document
+    python benchmark.py embedding --backends torch onnx-int8 --repeat 3
+    python benchmark.py embedding --workers 8           # adds process-pool rows
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from config import Config
+
+def load_chunks(pdf_path: str = None, count: int = 256) -> List[str]:
+    """Chunks of a real PDF, or synthetic chunks of varying length"""
+    if pdf_path:
+        from pdf_utils import chunk_text, extract_text_from_pdf
+        return chunk_text(extract_text_from_pdf(pdf_path), chunk_size=Config.CHUNK_SIZE, overlap=Config.CHUNK_OVERLAP)
+
+    rng = random.Random(42)
+    vocabulary = ("payment invoice contract party obligation warning step requirement date amount "
+                  "report analysis finding manual instruction total fee charge term condition").split()
+    # Mostly full chunks plus short tails, like chunk_text output on real documents
+    lengths = [Config.CHUNK_SIZE if rng.random() < 0.7 else rng.randint(10, Config.CHUNK_SIZE) for _ in range(count)]
+    return [' '.join(rng.choice(vocabulary) for _ in range(length)) for length in lengths]
+
+def benchmark_embedding(chunks: List[str], backends: List[str], repeat: int, parity: bool, workers: int = 1):
+    """Throughput of each embedding backend, with parity against torch"""
+    from vector_store import get_embedding_model
+
+    print(f"Embedding {len(chunks)} chunks, batch size {Config.EMBEDDING_BATCH_SIZE}, model {Config.EMBEDDING_MODEL}")
+    print(f"{'backend':<12}{'load s':>10}{'chunks/s':>12}{'best s':>10}")
+
+    reference = None
+    results = {}
+    for backend in backends:
+        started = time.perf_counter()
+        model = get_embedding_model(Config.EMBEDDING_MODEL, backend=backend)
+        model.encode(chunks[:2], convert_to_numpy=True, normalize_embeddings=True)
+        load_seconds = time.perf_counter() - started
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            embeddings = model.encode(chunks, batch_size=Config.EMBEDDING_BATCH_SIZE,
+                                      convert_to_numpy=True, normalize_embeddings=True)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[backend] = embeddings
+        if backend == 'torch':
+            reference = embeddings
+        print(f"{backend:<12}{load_seconds:>10.2f}{len(chunks) / best:>12.1f}{best:>10.3f}")
+
+        if workers > 1:
+            from embedding_pool import EmbeddingPool
+            started = time.perf_counter()
+            pool = EmbeddingPool(Config.EMBEDDING_MODEL, backend=backend, workers=workers)
+            pool.encode(chunks[:workers * 2])
+            load_seconds = time.perf_counter() - started
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                pool.encode(chunks)
+                timings.append(time.perf_counter() - started)
+            pool.shutdown()
+            best = min(timings)
+            label = f"{backend} x{workers}"
+            print(f"{label:<12}{load_seconds:>10.2f}{len(chunks) / best:>12.1f}{best:>10.3f}")
+
+    if parity and reference is not None:
+        from onnx_embedder import compare_embeddings
+
+        print("\nParity against torch (cosine similarity per chunk):")
+        for backend, embeddings in results.items():
+            if backend == 'torch':
+                continue
+            report = compare_embeddings(reference, embeddings)
+            print(f"  {backend:<12} min {report['min_cosine']:.5f}  mean {report['mean_cosine']:.5f}  "
+                  f"max diff {report['max_abs_diff']:.5f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG Assistant performance benchmarks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    embedding = subparsers.add_parser('embedding', help="Embedding throughput per backend")
+    embedding.add_argument('--pdf', help="Benchmark on the chunks of this PDF")
+    embedding.add_argument('--count', type=int, default=256, help="Number of synthetic chunks")
+    embedding.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'onnx-int8'])
+    embedding.add_argument('--repeat', type=int, default=3)
+    embedding.add_argument('--no-parity', action='store_true', help="Skip the parity check")
+    embedding.add_argument('--workers', type=int, default=1, help="Also benchmark a process pool of this size")
+
+    args = parser.parse_args()
+    if args.command == 'embedding':
+        chunks = load_chunks(args.pdf, args.count)
+        benchmark_embedding(chunks, args.backends, args.repeat, parity=not args.no_parity, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
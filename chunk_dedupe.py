@@ -0,0 +1,111 @@
+"""
+Duplicate chunk elimination for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Scanned documents repeat headers, footers and boilerplate pages, and every
+copy would otherwise be embedded, indexed and compete for the top-k. Before
+embedding, chunks are reduced to one representative per group of:
+  - exact duplicates: same normalized token sequence (BLAKE2 digest)
+  - near duplicates: MinHash estimate of the Jaccard similarity of word
+    shingles at or above DEDUPE_JACCARD, with candidates found through LSH
+    banding so chunks are not compared pairwise
+
+The first occurrence is kept. DedupeResult maps every input chunk to the
+chunk kept in its place, so offsets and pages of the removed copies can be
+kept as provenance.
+"""
+
+import hashlib
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+from config import Config
+
+# Largest prime below 2**32: (p - 1)**2 + (p - 1) still fits in uint64
+_PRIME = 4294967291
+
+@dataclass
+class DedupeResult:
+    keep: List[int]  # positions of the kept chunks, in input order
+    representative: List[int]  # for every input chunk, the position of the chunk kept in its place
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    duplicates: Dict[int, List[int]] = field(default_factory=dict)  # kept position -> removed positions
+
+    def report(self) -> dict:
+        return {
+            'input_chunks': len(self.representative),
+            'kept_chunks': len(self.keep),
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+        }
+
+def _tokens(chunk: str) -> List[str]:
+    return chunk.lower().split()
+
+def _shingle_hashes(tokens: List[str], size: int) -> np.ndarray:
+    if len(tokens) <= size:
+        shingles = [' '.join(tokens)]
+    else:
+        shingles = {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64)
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a * x + b) mod p, vectorized over shingles"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_hashes: np.ndarray) -> np.ndarray:
+        hashed = ((shingle_hashes[:, None] % np.uint64(_PRIME)) * self.a + self.b) % np.uint64(_PRIME)
+        return hashed.min(axis=0)
+
+def dedupe_chunks(chunks: List[str], jaccard: float = None, shingle_size: int = None,
+                  num_perm: int = None, bands: int = None) -> DedupeResult:
+    """Find exact and near-duplicate chunks; see the module docstring"""
+    jaccard = Config.DEDUPE_JACCARD if jaccard is None else jaccard
+    shingle_size = shingle_size or Config.DEDUPE_SHINGLE_SIZE
+    num_perm = num_perm or Config.DEDUPE_NUM_PERM
+    bands = bands or Config.DEDUPE_BANDS
+    rows = num_perm // bands
+
+    hasher = MinHasher(num_perm)
+    exact_seen: Dict[bytes, int] = {}
+    buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+    signatures: Dict[int, np.ndarray] = {}
+    result = DedupeResult(keep=[], representative=[])
+
+    for position, chunk in enumerate(chunks):
+        tokens = _tokens(chunk)
+        digest = hashlib.blake2b(' '.join(tokens).encode(), digest_size=16).digest()
+        kept = exact_seen.get(digest)
+        if kept is not None:
+            result.exact_duplicates += 1
+        elif jaccard < 1.0 and tokens:
+            signature = hasher.signature(_shingle_hashes(tokens, shingle_size))
+            band_keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+            candidates = {other for band, key in enumerate(band_keys) for other in buckets[band].get(key, ())}
+            for other in sorted(candidates):
+                if np.mean(signatures[other] == signature) >= jaccard:
+                    kept = other
+                    result.near_duplicates += 1
+                    break
+            if kept is None:
+                signatures[position] = signature
+                for band, key in enumerate(band_keys):
+                    buckets[band].setdefault(key, []).append(position)
+
+        if kept is None:
+            exact_seen[digest] = position
+            result.keep.append(position)
+            result.representative.append(position)
+        else:
+            result.representative.append(kept)
+            result.duplicates.setdefault(kept, []).append(position)
+    return result
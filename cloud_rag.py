@@ -5,48 +5,24 @@ Version: 2.0 (Cloud Edition)
 """
 
 import os
+import time
 import openai
 from datetime import datetime
 
+from config import Config
+from extractive_answer import extractive_answer
+from context_packer import get_token_counter
+from rag_request import RAGRequest, render_prompt
+from summarizer import MapReduceSummarizer
+from telemetry import observe
+
 def get_simple_answer(context_chunks, question, chat_history=None):
-    """Enhanced rule-based answering with chat history awareness"""
-    context = ' '.join(context_chunks)
-    
-    # Simple keyword matching for demonstration
-    question_lower = question.lower()
-    
-    if not context.strip():
-        return "I don't have enough context to answer your question. Please upload a document first."
-    
-    # Extract relevant sentences with better scoring
-    sentences = context.split('.')
-    relevant_sentences = []
-    
-    # Enhanced keyword matching with stemming-like approach
-    question_words = [word.strip('.,!?') for word in question_lower.split() if len(word) > 3]
-    
-    for sentence in sentences:
-        sentence_lower = sentence.lower()
-        score = 0
-        for word in question_words:
-            if word in sentence_lower:
-                score += 1
-            # Partial matching for better coverage
-            for sent_word in sentence_lower.split():
-                if word in sent_word or sent_word in word:
-                    score += 0.5
-        
-        if score > 0:
-            relevant_sentences.append((sentence.strip(), score))
-    
-    # Sort by relevance score
-    relevant_sentences.sort(key=lambda x: x[1], reverse=True)
-    
-    if relevant_sentences:
-        top_sentences = [sent[0] for sent in relevant_sentences[:3]]
-        return f"Based on the document: {' '.join(top_sentences)}."
-    else:
-        return f"I found information in the document, but couldn't find a direct answer to your question. The document mainly discusses: {context[:200]}..."
+    """Rule-based answering used when no LLM is reachable.
+
+    context_chunks may be chunk strings or enhanced_search results; see
+    extractive_answer for the scoring.
+    """
+    return extractive_answer(context_chunks, question)
 
 def check_openai_available():
     """Check if OpenAI API is available and configured"""
@@ -82,9 +58,10 @@ def check_openai_available():
         return False, f"OpenAI API connection failed: {str(e)}"
 
 def ask_openai_cloud(prompt, model_name="gpt-4o-mini", temperature=0.7):
-    """Ask OpenAI model for cloud deployment"""
+    """Ask OpenAI model for cloud deployment (streamed, to measure time to first token)"""
     try:
-        response = openai.chat.completions.create(
+        started = time.perf_counter()
+        stream = openai.chat.completions.create(
             model=model_name,
             messages=[
                 {
@@ -97,71 +74,41 @@ def ask_openai_cloud(prompt, model_name="gpt-4o-mini", temperature=0.7):
                 }
             ],
             temperature=temperature,
-            max_tokens=800,
-            top_p=0.9
+            max_tokens=Config.LLM_MAX_ANSWER_TOKENS,
+            top_p=0.9,
+            stream=True
         )
         
-        return response.choices[0].message.content.strip()
+        pieces = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not pieces:
+                    observe('llm_ttft', time.perf_counter() - started)
+                pieces.append(delta)
+        observe('llm_total', time.perf_counter() - started)
+        
+        return ''.join(pieces).strip()
         
     except Exception as e:
         return f"Error connecting to OpenAI: {str(e)}"
 
-def build_enhanced_prompt(context_chunks, question, chat_history=None, document_metadata=None):
+def build_enhanced_prompt(context_chunks, question, chat_history=None, document_metadata=None, model_name=None):
     """Build an enhanced prompt with conversation history and metadata"""
-    context = '\n\n'.join(context_chunks)
-    
-    # Build chat history context
-    history_context = ""
-    if chat_history and len(chat_history) > 0:
-        history_context = "\n\nPrevious conversation:\n"
-        for i, (q, a) in enumerate(chat_history[-3:]):  # Last 3 exchanges
-            history_context += f"Q{i+1}: {q}\nA{i+1}: {a}\n"
-    
-    # Add document metadata if available
-    metadata_context = ""
-    if document_metadata:
-        metadata_context = f"\nDocument info: {document_metadata}\n"
-    
-    prompt = f"""You are an expert document analyst and question-answering assistant. Your job is to provide accurate, detailed, and helpful answers based on the provided document context.
-
-INSTRUCTIONS:
-1. Use ONLY the information provided in the context below
-2. If the context doesn't contain enough information, clearly state what's missing
-3. Provide specific details and examples when available
-4. If this is a follow-up question, consider the previous conversation
-5. Structure your answer clearly with bullet points or numbered lists when appropriate
-6. Quote specific parts of the document when relevant
-
-DOCUMENT CONTEXT:
-{context}{metadata_context}
-{history_context}
-CURRENT QUESTION: {question}
+    request = RAGRequest(question, context_chunks, chat_history or [], document_metadata)
+    return render_prompt(request, model_name).full
 
-ANSWER: Provide a comprehensive, accurate answer based on the document context above. If you need to make any assumptions or if information is unclear, explicitly state this."""
+def ask_smart_llm(request, chat_history=None, model_preference="balanced"):
+    """Enhanced LLM interaction with multiple strategies for cloud deployment.
 
-    return prompt
+    request is a RAGRequest; the prompt is rendered here, once, for the
+    selected model. A plain prompt string is still accepted but then the
+    rule-based fallback has no context to work with.
+    """
+    if isinstance(request, str):
+        request = RAGRequest(question="", history=chat_history or [], raw_prompt=request)
 
-def ask_smart_llm(prompt, chat_history=None, model_preference="balanced"):
-    """Enhanced LLM interaction with multiple strategies for cloud deployment"""
     try:
-        # Extract question and context from prompt for fallback
-        lines = prompt.split('\n')
-        question = ""
-        context_chunks = []
-        
-        for i, line in enumerate(lines):
-            if line.startswith("CURRENT QUESTION:"):
-                question = line.replace("CURRENT QUESTION:", "").strip()
-            elif line.startswith("DOCUMENT CONTEXT:"):
-                # Find context section
-                context_start = i + 1
-                context_lines = []
-                for j in range(context_start, len(lines)):
-                    if lines[j].startswith("CURRENT QUESTION:"):
-                        break
-                    context_lines.append(lines[j])
-                context_chunks = ['\n'.join(context_lines)]
-        
         # Check if OpenAI API is available
         is_available, status = check_openai_available()
         
@@ -169,26 +116,43 @@ def ask_smart_llm(prompt, chat_history=None, model_preference="balanced"):
             print(f"Using OpenAI model: {status}")
             
             # Adjust temperature based on question type
-            temperature = 0.3  # Lower for factual questions
-            if any(word in question.lower() for word in ['explain', 'describe', 'how', 'why', 'what']):
-                temperature = 0.7  # Higher for explanatory questions
+            temperature = request.choose_temperature()
             
-            response = ask_openai_cloud(prompt, status, temperature)
+            response = ask_openai_cloud(render_prompt(request, status).full, status, temperature)
             
             if not response.startswith("Error"):
                 return response
             else:
                 print(f"OpenAI error: {response}")
-                return get_simple_answer(context_chunks, question, chat_history)
+                return get_simple_answer(request.chunks, request.question, request.history)
         else:
             print(f"OpenAI status: {status}")
-            return get_simple_answer(context_chunks, question, chat_history)
+            return get_simple_answer(request.chunks, request.question, request.history)
             
     except Exception as e:
         print(f"Error in ask_smart_llm: {e}")
-        context_chunks = context_chunks if 'context_chunks' in locals() else [""]
-        question = question if 'question' in locals() else "your question"
-        return get_simple_answer(context_chunks, question, chat_history)
+        return get_simple_answer(request.chunks, request.question or "your question", request.history)
+
+def summarize_document(question, chunks, chunk_metadata=None):
+    """Answer a whole-document question by map-reduce over all chunks (see summarizer)"""
+    try:
+        is_available, status = check_openai_available()
+        if not is_available:
+            print(f"OpenAI status: {status}")
+            return get_simple_answer(chunks, question)
+
+        def generate(prompt):
+            response = ask_openai_cloud(prompt, status, 0.3)
+            if response.startswith("Error"):
+                raise RuntimeError(response)
+            return response
+
+        print(f"Using OpenAI model: {status} (map-reduce over {len(chunks)} chunks)")
+        summarizer = MapReduceSummarizer(generate, status, count_tokens=get_token_counter(status))
+        return summarizer.answer(question, chunks, chunk_metadata)
+    except Exception as e:
+        print(f"Error in summarize_document: {e}")
+        return get_simple_answer(chunks, question)
 
 def analyze_document_content(text_chunks):
     """Analyze document to provide metadata for better prompting"""
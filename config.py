@@ -20,12 +20,39 @@ class Config:
     # Model Configuration
     DEFAULT_MODEL = os.getenv('OLLAMA_MODEL', 'mistral:latest')
     OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'localhost:11434')
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # Keep model and KV cache loaded between turns
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')  # 'torch', 'onnx' or 'onnx-int8'
+    EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv('EMBEDDING_MAX_SEQ_LENGTH', '256'))
+    ONNX_CACHE_DIR = os.getenv('ONNX_CACHE_DIR', 'models/onnx')
+    ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))  # 0 lets ONNX Runtime decide
+    TOKENIZER_NAME = os.getenv('TOKENIZER_NAME', '')  # Override the tokenizer used for prompt budgeting
+    
+    # Prompt Budget Settings (tokens)
+    LLM_CONTEXT_WINDOW = int(os.getenv('LLM_CONTEXT_WINDOW', '4096'))
+    LLM_MAX_ANSWER_TOKENS = int(os.getenv('LLM_MAX_ANSWER_TOKENS', '800'))
+    HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '600'))
+    
+    # Conversation Settings
+    CONVERSATION_DB = os.getenv('CONVERSATION_DB', 'conversations.db')  # SQLite file holding all chat turns
+    HISTORY_WINDOW = int(os.getenv('HISTORY_WINDOW', '3'))  # exchanges kept in memory and sent to the model
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '20'))  # earlier exchanges shown per page
+    HISTORY_SUMMARY_CHARS = int(os.getenv('HISTORY_SUMMARY_CHARS', '800'))  # running summary of older questions
+    
+    # Whole-document Summarization Settings
+    SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'True').lower() == 'true'  # answer "summarize this document" by map-reduce over all chunks
+    SUMMARY_PARALLELISM = int(os.getenv('SUMMARY_PARALLELISM', '4'))  # chunk groups summarized concurrently
+    SUMMARY_CACHE_DB = os.getenv('SUMMARY_CACHE_DB', 'summaries.db')  # SQLite file caching partial summaries per document
     
     # Processing Settings
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '400'))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '100'))
     MAX_SEARCH_RESULTS = int(os.getenv('MAX_SEARCH_RESULTS', '10'))
+    DEDUPE_CHUNKS = os.getenv('DEDUPE_CHUNKS', 'True').lower() == 'true'  # drop duplicate chunks before embedding
+    DEDUPE_JACCARD = float(os.getenv('DEDUPE_JACCARD', '0.85'))  # near-duplicate shingle similarity; 1.0 = exact only
+    DEDUPE_SHINGLE_SIZE = int(os.getenv('DEDUPE_SHINGLE_SIZE', '3'))  # words per shingle
+    DEDUPE_NUM_PERM = int(os.getenv('DEDUPE_NUM_PERM', '64'))  # MinHash signature length
+    DEDUPE_BANDS = int(os.getenv('DEDUPE_BANDS', '16'))  # LSH bands (NUM_PERM / BANDS rows each)
     
     # UI Configuration
     APP_TITLE = os.getenv('APP_TITLE', f"RAG Assistant by {AUTHOR}")
@@ -35,16 +62,45 @@ class Config:
     # OCR Settings
     TESSERACT_PATH = os.getenv('TESSERACT_PATH', 'tesseract')
     OCR_LANGUAGE = os.getenv('OCR_LANGUAGE', 'eng')
+    OCR_TARGET_DPI = int(os.getenv('OCR_TARGET_DPI', '300'))
+    OCR_MAX_DIMENSION = int(os.getenv('OCR_MAX_DIMENSION', '4000'))  # pixels, longest side
+    OCR_NOISE_THRESHOLD = float(os.getenv('OCR_NOISE_THRESHOLD', '8.0'))  # denoise above this sigma
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+    OCR_PAGE_TIMEOUT = float(os.getenv('OCR_PAGE_TIMEOUT', '60'))  # seconds per page, 0 = no limit
     
     # File Settings
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', '100')) * 1024 * 1024  # 100MB
     ALLOWED_EXTENSIONS = ['pdf', 'png', 'jpg', 'jpeg']
+    UPLOAD_SPILL_THRESHOLD = int(os.getenv('UPLOAD_SPILL_THRESHOLD', '32')) * 1024 * 1024  # larger uploads go to a temp file
     TEMP_DIR = Path(os.getenv('TEMP_DIR', 'temp'))
+    INDEX_PATH = os.getenv('INDEX_PATH', 'faiss.index')
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'index_snapshots')  # versioned index snapshots; '' saves INDEX_PATH in place
+    SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', '3'))  # snapshots kept on disk, including the current one
+    SNAPSHOT_VERIFY_CHECKSUMS = os.getenv('SNAPSHOT_VERIFY_CHECKSUMS', 'False').lower() == 'true'  # sizes are always checked
+    SNAPSHOT_POLL_SECONDS = float(os.getenv('SNAPSHOT_POLL_SECONDS', '1'))  # how often the API checks for a new snapshot
     
     # Performance Settings
     EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+    EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', '1'))  # >1 embeds large ingests in a process pool
+    EMBEDDING_THREADS_PER_WORKER = int(os.getenv('EMBEDDING_THREADS_PER_WORKER', '0'))  # 0 splits cores evenly
+    EMBEDDING_POOL_MIN_CHUNKS = int(os.getenv('EMBEDDING_POOL_MIN_CHUNKS', '256'))
     VECTOR_DIMENSIONS = int(os.getenv('VECTOR_DIMENSIONS', '384'))
+    INDEX_SHARDS = int(os.getenv('INDEX_SHARDS', '1'))  # >1 splits the index into parallel-searched shards
+    INDEX_SEARCH_THREADS = int(os.getenv('INDEX_SEARCH_THREADS', '0'))  # 0 = one per shard
+    HIERARCHICAL_SEARCH = os.getenv('HIERARCHICAL_SEARCH', 'True').lower() == 'true'  # search top sections, then their chunks
+    HIERARCHICAL_MIN_CHUNKS = int(os.getenv('HIERARCHICAL_MIN_CHUNKS', '2000'))  # smaller indexes are searched flat
+    SECTION_SIZE = int(os.getenv('SECTION_SIZE', '8'))  # chunks per section
+    SECTION_TOP_K = int(os.getenv('SECTION_TOP_K', '16'))  # sections whose chunks are searched
     MAX_MEMORY_USAGE = int(os.getenv('MAX_MEMORY_USAGE', '8')) * 1024 * 1024 * 1024  # 8GB
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'True').lower() == 'true'
+    QUERY_BATCHING = os.getenv('QUERY_BATCHING', 'True').lower() == 'true'
+    QUERY_BATCH_SIZE = int(os.getenv('QUERY_BATCH_SIZE', '16'))  # Max concurrent queries embedded together
+    QUERY_BATCH_MAX_DELAY_MS = float(os.getenv('QUERY_BATCH_MAX_DELAY_MS', '2'))  # Max wait to fill a batch
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '256'))  # query -> embedding LRU entries
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '256'))  # query -> top-k IDs LRU entries, 0 = off
+    MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.7'))  # relevance vs diversity of search results; 1.0 = off
+    MMR_CANDIDATE_FACTOR = int(os.getenv('MMR_CANDIDATE_FACTOR', '4'))  # shortlist of top_k * factor for MMR
+    MMR_DUPLICATE_THRESHOLD = float(os.getenv('MMR_DUPLICATE_THRESHOLD', '0.95'))  # drop results this similar to a picked one
     
     # Security Settings
     ENABLE_HTTPS = os.getenv('ENABLE_HTTPS', 'False').lower() == 'true'
@@ -56,6 +112,23 @@ class Config:
     LOG_ROTATION = os.getenv('LOG_ROTATION', '10 MB')
     LOG_RETENTION = os.getenv('LOG_RETENTION', '7 days')
     
+    # Telemetry Settings
+    TELEMETRY_ENABLED = os.getenv('TELEMETRY_ENABLED', 'True').lower() == 'true'
+    METRICS_JSON_PATH = os.getenv('METRICS_JSON_PATH', '')  # e.g. logs/metrics.json; empty = don't write
+    
+    # Profiling Settings (opt-in; see profiling.py)
+    PROFILING_ENABLED = os.getenv('PROFILING', 'False').lower() == 'true'
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_TRACEMALLOC = os.getenv('PROFILE_TRACEMALLOC', 'True').lower() == 'true'
+    PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1'))
+    PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', '25'))
+    
+    # API Server Settings
+    API_HOST = os.getenv('API_HOST', '0.0.0.0')
+    API_PORT = int(os.getenv('API_PORT', '8000'))
+    API_WORKERS = int(os.getenv('API_WORKERS', '2'))
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'ollama')  # 'ollama' or 'openai'
+    
     # Health Check Settings
     HEALTH_CHECK_INTERVAL = int(os.getenv('HEALTH_CHECK_INTERVAL', '30'))
     
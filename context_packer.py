@@ -0,0 +1,199 @@
+"""
+Token-aware prompt context packing for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Retrieved chunks overlap heavily (chunk_text uses a word overlap), so sending
+them verbatim wastes the LLM context window. This module merges overlapping
+or adjacent chunks by their word offsets, drops duplicate spans, and fits
+context and chat history into a token budget measured with the target
+model's tokenizer (falling back to a character/word estimate).
+"""
+
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from config import Config
+from lazy_imports import module_available
+
+# Hugging Face tokenizers matching the Ollama model families we prefer
+OLLAMA_TOKENIZERS = [
+    ('mistral', 'mistralai/Mistral-7B-Instruct-v0.2'),
+    ('llama3.2', 'meta-llama/Llama-3.2-1B-Instruct'),
+    ('llama3', 'meta-llama/Meta-Llama-3-8B-Instruct'),
+]
+
+# Passages shorter than this are not worth adding after truncation
+MIN_PASSAGE_TOKENS = 32
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate used when no tokenizer is available"""
+    if not text:
+        return 0
+    return max(len(text) // 4, int(len(text.split()) * 1.3)) + 1
+
+@lru_cache(maxsize=8)
+def get_token_counter(model_name: Optional[str] = None) -> Callable[[str], int]:
+    """Return a function counting tokens for the given LLM"""
+    name = (model_name or '').lower()
+
+    # OpenAI models (cloud edition)
+    if name.startswith('gpt') and module_available('tiktoken'):
+        try:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(name)
+            return lambda text: len(encoding.encode(text))
+        except Exception as e:
+            print(f"tiktoken unavailable for {model_name}: {e}")
+
+    # Local Ollama models: use the matching Hugging Face tokenizer if cached
+    repo = Config.TOKENIZER_NAME or next((repo for prefix, repo in OLLAMA_TOKENIZERS if name.startswith(prefix)), None)
+    if repo and module_available('transformers'):
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(repo, local_files_only=not Config.TOKENIZER_NAME)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            print(f"Tokenizer {repo} not available, estimating tokens: {e}")
+
+    return estimate_tokens
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+def _as_items(context_chunks) -> List[Tuple[str, dict]]:
+    """Accept plain chunk strings or enhanced_search results"""
+    items = []
+    for entry in context_chunks or []:
+        if isinstance(entry, str):
+            items.append((entry, {}))
+        else:
+            chunk = entry[0]
+            metadata = entry[2] if len(entry) > 2 else {}
+            items.append((chunk, metadata or {}))
+    return items
+
+def merge_overlapping_chunks(context_chunks) -> List[str]:
+    """Merge overlapping/adjacent chunks and drop duplicates, keeping relevance order"""
+    with_offsets = []
+    passages = []
+    for rank, (chunk, metadata) in enumerate(_as_items(context_chunks)):
+        if 'start_word' in metadata and 'end_word' in metadata:
+            with_offsets.append([metadata['start_word'], metadata['end_word'], chunk.split(' '), rank])
+        else:
+            passages.append((rank, chunk))
+
+    # Chunks are space-joined word tokens, so offsets index directly into split(' ')
+    with_offsets.sort(key=lambda span: (span[0], -span[1]))
+    merged = []
+    for start, end, tokens, rank in with_offsets:
+        if merged and start <= merged[-1][1]:
+            last = merged[-1]
+            if end > last[1]:
+                last[2] = last[2] + tokens[last[1] - start:]
+                last[1] = end
+            last[3] = min(last[3], rank)
+        else:
+            merged.append([start, end, tokens, rank])
+
+    passages.extend((rank, ' '.join(tokens)) for start, end, tokens, rank in merged)
+    passages.sort(key=lambda passage: passage[0])
+
+    # Drop passages fully contained in a more relevant one
+    kept = []
+    kept_normalized = []
+    for rank, text in passages:
+        normalized = _normalize(text)
+        if not normalized or any(normalized in other for other in kept_normalized):
+            continue
+        kept.append(text)
+        kept_normalized.append(normalized)
+
+    return remove_duplicate_sentences(kept)
+
+def remove_duplicate_sentences(passages: List[str], min_words: int = 5) -> List[str]:
+    """Remove sentences already present in an earlier passage"""
+    seen = set()
+    result = []
+    for passage in passages:
+        sentences = re.split(r'(?<=[.!?])\s+', passage)
+        unique = []
+        for sentence in sentences:
+            normalized = _normalize(sentence)
+            if len(normalized.split()) >= min_words:
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+            unique.append(sentence)
+        text = ' '.join(unique).strip()
+        if text:
+            result.append(text)
+    return result
+
+def truncate_to_tokens(text: str, budget: int, count_tokens: Callable[[str], int]) -> str:
+    """Cut text at a word boundary so it fits within budget tokens"""
+    if count_tokens(text) <= budget:
+        return text
+    words = text.split(' ')
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(' '.join(words[:mid])) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return ' '.join(words[:low])
+
+def pack_context(context_chunks, budget_tokens: int, count_tokens: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """Merge, deduplicate and fit retrieved chunks into budget_tokens"""
+    packed = []
+    remaining = budget_tokens
+    for passage in merge_overlapping_chunks(context_chunks):
+        # Separator between passages costs a couple of tokens
+        cost = count_tokens(passage) + 2
+        if cost <= remaining:
+            packed.append(passage)
+            remaining -= cost
+        elif remaining >= MIN_PASSAGE_TOKENS:
+            packed.append(truncate_to_tokens(passage, remaining - 2, count_tokens))
+            break
+        else:
+            break
+    return packed
+
+def fit_history(chat_history: Sequence[Tuple[str, str]], budget_tokens: int,
+                count_tokens: Callable[[str], int] = estimate_tokens) -> List[Tuple[str, str]]:
+    """Keep the most recent Q/A pairs that fit in budget_tokens"""
+    kept = []
+    remaining = budget_tokens
+    for question, answer in reversed(list(chat_history or [])):
+        cost = count_tokens(f"Q: {question}\nA: {answer}\n")
+        if cost <= remaining:
+            kept.append((question, answer))
+            remaining -= cost
+            continue
+        # Shorten the answer of the turn that doesn't fit, then stop
+        answer_budget = remaining - count_tokens(f"Q: {question}\nA: \n")
+        if answer_budget >= MIN_PASSAGE_TOKENS:
+            kept.append((question, truncate_to_tokens(answer, answer_budget, count_tokens) + " ..."))
+        break
+    kept.reverse()
+    return kept
+
+def pack_prompt_inputs(context_chunks, chat_history, overhead_text: str,
+                       model_name: Optional[str] = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Split the model context window between history and document context.
+
+    overhead_text is the prompt rendered without context or history (the
+    instructions, question and metadata); whatever is left after it and the
+    answer reservation is shared, with history capped by HISTORY_TOKEN_BUDGET.
+    """
+    count_tokens = get_token_counter(model_name)
+    available = Config.LLM_CONTEXT_WINDOW - Config.LLM_MAX_ANSWER_TOKENS - count_tokens(overhead_text)
+    available = max(available, 0)
+
+    history = fit_history(chat_history, min(Config.HISTORY_TOKEN_BUDGET, available // 4), count_tokens)
+    history_tokens = sum(count_tokens(f"Q: {q}\nA: {a}\n") for q, a in history)
+    passages = pack_context(context_chunks, available - history_tokens, count_tokens)
+    return passages, history
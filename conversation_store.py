@@ -0,0 +1,175 @@
+"""
+Persistent conversation history for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Every exchange is written to SQLite (CONVERSATION_DB). A Conversation keeps
+only the last HISTORY_WINDOW exchanges in memory, which is all the prompt
+uses, and folds older questions into a short running summary. Earlier turns
+are read back a page at a time and exports stream row by row from disk, so
+the cost of a turn does not grow with the length of the session.
+"""
+
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    summary TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS turns (
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, turn)
+);
+"""
+
+class ConversationStore:
+    """SQLite-backed turns of all conversations, shared by the sessions of a process"""
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.CONVERSATION_DB
+        self._lock = threading.Lock()
+        self._db = self._connect()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        # WAL lets exports and other processes read while a session writes
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA foreign_keys=ON")
+        return db
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock, self._db:
+            return self._db.execute(sql, params).fetchall()
+
+    def create(self, conversation_id: str = None) -> str:
+        conversation_id = conversation_id or uuid.uuid4().hex
+        self._execute("INSERT OR IGNORE INTO conversations (id, created_at) VALUES (?, ?)",
+                      (conversation_id, time.time()))
+        return conversation_id
+
+    def append(self, conversation_id: str, question: str, answer: str, summary: str = None) -> int:
+        """Store one exchange (and the updated summary); returns its turn number"""
+        with self._lock, self._db:
+            turn = self._db.execute("SELECT COALESCE(MAX(turn), -1) + 1 FROM turns WHERE conversation_id = ?",
+                                    (conversation_id,)).fetchone()[0]
+            self._db.execute("INSERT INTO turns VALUES (?, ?, ?, ?, ?)",
+                             (conversation_id, turn, question, answer, time.time()))
+            if summary is not None:
+                self._db.execute("UPDATE conversations SET summary = ? WHERE id = ?", (summary, conversation_id))
+        return turn
+
+    def count(self, conversation_id: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM turns WHERE conversation_id = ?", (conversation_id,))[0][0]
+
+    def summary(self, conversation_id: str) -> str:
+        rows = self._execute("SELECT summary FROM conversations WHERE id = ?", (conversation_id,))
+        return rows[0][0] if rows else ""
+
+    def turns(self, conversation_id: str, offset: int = 0, limit: int = None) -> List[Tuple[str, str]]:
+        """Exchanges oldest first, starting at turn offset"""
+        return self._execute(
+            "SELECT question, answer FROM turns WHERE conversation_id = ? ORDER BY turn LIMIT ? OFFSET ?",
+            (conversation_id, -1 if limit is None else limit, offset))
+
+    def iter_turns(self, conversation_id: str, batch_size: int = 100) -> Iterator[Tuple[int, str, str, float]]:
+        """Stream (turn, question, answer, created_at) from disk on a separate connection"""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            cursor = db.execute("SELECT turn, question, answer, created_at FROM turns "
+                                "WHERE conversation_id = ? ORDER BY turn", (conversation_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db.close()
+
+    def clear(self, conversation_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+            self._db.execute("UPDATE conversations SET summary = '' WHERE id = ?", (conversation_id,))
+
+def _fold_summary(summary: str, question: str, max_chars: int) -> str:
+    """Add an evicted question to the running summary, dropping the oldest when over max_chars"""
+    topics = [topic for topic in summary.split("\n") if topic] + [" ".join(question.split())[:200]]
+    while len(topics) > 1 and sum(len(topic) + 1 for topic in topics) > max_chars:
+        topics.pop(0)
+    return "\n".join(topics)
+
+class Conversation:
+    """One session's conversation: a bounded in-memory window over its stored turns"""
+
+    def __init__(self, conversation_id: str = None, store: ConversationStore = None, window: int = None):
+        self.store = store or get_conversation_store()
+        self.id = self.store.create(conversation_id)
+        self.window = Config.HISTORY_WINDOW if window is None else window
+        total = self.store.count(self.id)
+        self.recent = deque(self.store.turns(self.id, max(0, total - self.window)), maxlen=self.window)
+        self.total = total
+        self.summary = self.store.summary(self.id)
+
+    def append(self, question: str, answer: str):
+        if len(self.recent) == self.window and self.window:
+            # The oldest exchange leaves the window; keep the gist of what was asked
+            self.summary = _fold_summary(self.summary, self.recent[0][0], Config.HISTORY_SUMMARY_CHARS)
+        self.store.append(self.id, question, answer, self.summary)
+        self.recent.append((question, answer))
+        self.total += 1
+
+    def prompt_history(self) -> List[Tuple[str, str]]:
+        """History for RAGRequest: the summary of earlier turns, then the window"""
+        history = list(self.recent)
+        if self.summary:
+            history.insert(0, ("(earlier questions in this conversation)", self.summary))
+        return history
+
+    @property
+    def earlier_count(self) -> int:
+        """Turns no longer held in memory"""
+        return self.total - len(self.recent)
+
+    def page(self, page: int, page_size: int = None) -> List[Tuple[str, str]]:
+        """One page (0 = oldest) of the turns before the window, read from disk"""
+        page_size = page_size or Config.HISTORY_PAGE_SIZE
+        start = page * page_size
+        return self.store.turns(self.id, start, max(0, min(page_size, self.earlier_count - start)))
+
+    def export_lines(self) -> Iterator[str]:
+        """Plain-text export, streamed from disk"""
+        yield f"Chat Export - {time.strftime('%Y-%m-%d %H:%M')}\n\n"
+        for turn, question, answer, created_at in self.store.iter_turns(self.id):
+            yield f"Q: {question}\nA: {answer}\n" + "=" * 50 + "\n\n"
+
+    def clear(self):
+        self.store.clear(self.id)
+        self.recent.clear()
+        self.total = 0
+        self.summary = ""
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide conversation store, created on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+    return _store
@@ -0,0 +1,109 @@
+"""
+Dynamic micro-batching of query embeddings for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Concurrent callers (API workers, Streamlit sessions) each embed a single
+query. EmbeddingBatcher queues those requests, waits at most max_delay_ms
+for others to arrive (up to max_batch_size), runs one batched encode and
+fans the rows back to the callers.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List
+
+import numpy as np
+
+class EmbeddingBatcher:
+    """Batches single-query encodes arriving from concurrent threads"""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = 16,
+                 max_delay_ms: float = 2.0, name: str = "query-batcher"):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max_delay_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.encode_seconds = 0.0
+        self._queue_delays = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text and return a Future for its (1, dim) embedding"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text: str, timeout: float = None) -> np.ndarray:
+        """Embed one text as part of whatever batch it lands in"""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Still take anything already waiting, without blocking
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                embeddings = self.encode_fn([text for text, _, _ in batch])
+                for (_, future, _), embedding in zip(batch, embeddings):
+                    future.set_result(embedding[None, :])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finished = time.perf_counter()
+
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.encode_seconds += finished - started
+                self._batch_sizes.append(len(batch))
+                self._queue_delays.extend(started - queued for _, _, queued in batch)
+
+    def metrics(self) -> dict:
+        """Batch fill and queueing delay over recent batches"""
+        with self._stats_lock:
+            delays = np.asarray(self._queue_delays, dtype=np.float64) * 1000
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'mean_batch_size': round(float(sizes.mean()), 2) if sizes.size else 0.0,
+                'batch_fill_ratio': round(float(sizes.mean()) / self.max_batch_size, 3) if sizes.size else 0.0,
+                'queue_delay_ms_mean': round(float(delays.mean()), 3) if delays.size else 0.0,
+                'queue_delay_ms_p95': round(float(np.percentile(delays, 95)), 3) if delays.size else 0.0,
+                'encode_ms_per_batch': round(self.encode_seconds * 1000 / self.batches, 3) if self.batches else 0.0,
+            }
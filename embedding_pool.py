@@ -0,0 +1,167 @@
+"""
+Multi-process embedding for large ingests in Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Small models like MiniLM leave most cores idle when one process embeds with
+torch intra-op threading. EmbeddingPool starts EMBEDDING_WORKERS processes,
+each with its own model copy and a pinned thread count, shards the chunks
+across them in length-sorted batches and returns embeddings in the
+original order.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+
+from config import Config
+
+# Batches hold roughly batch_size full-length sequences worth of tokens
+MAX_ADAPTIVE_BATCH_FACTOR = 4
+
+def estimate_token_length(text: str) -> int:
+    """Cheap token-length estimate, capped at the model's max sequence length"""
+    return min(int(len(text.split()) * 1.3) + 2, Config.EMBEDDING_MAX_SEQ_LENGTH)
+
+def token_lengths(model, texts: List[str]) -> np.ndarray:
+    """Token count of each text (after truncation) using the model's tokenizer"""
+    try:
+        if hasattr(model, 'token_lengths'):
+            return np.asarray(model.token_lengths(texts), dtype=np.int64)
+        if hasattr(model, 'tokenizer'):
+            max_length = getattr(model, 'max_seq_length', None) or Config.EMBEDDING_MAX_SEQ_LENGTH
+            encoded = model.tokenizer(texts, truncation=True, max_length=max_length)['input_ids']
+            return np.array([len(ids) for ids in encoded], dtype=np.int64)
+    except Exception as e:
+        print(f"Falling back to estimated token lengths: {e}")
+    return np.array([estimate_token_length(text) for text in texts], dtype=np.int64)
+
+def length_sorted_batches(texts: List[str], batch_size: int, adaptive: bool = True,
+                          lengths: np.ndarray = None) -> List[np.ndarray]:
+    """Group text indices into batches of similar length, longest first.
+
+    With adaptive=True short texts are packed into larger batches so every
+    batch carries about batch_size * EMBEDDING_MAX_SEQ_LENGTH tokens.
+    lengths defaults to estimate_token_length of each text.
+    """
+    if lengths is None:
+        lengths = np.array([estimate_token_length(text) for text in texts], dtype=np.int64)
+    order = np.argsort(-lengths, kind='stable')
+    token_budget = batch_size * Config.EMBEDDING_MAX_SEQ_LENGTH
+    max_batch = batch_size * MAX_ADAPTIVE_BATCH_FACTOR if adaptive else batch_size
+
+    batches = []
+    start = 0
+    while start < len(order):
+        # Sorted descending, so the first text sets the padded length of the batch
+        size = min(max(token_budget // max(lengths[order[start]], 1), 1), max_batch) if adaptive else batch_size
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def padding_report(batches: List[np.ndarray], lengths: np.ndarray, batch_size: int) -> dict:
+    """Padding per batch, compared with batching the texts in original order"""
+    def padded_tokens(groups):
+        return [int(lengths[group].max()) * len(group) for group in groups if len(group)]
+
+    real = [int(lengths[batch].sum()) for batch in batches]
+    padded = padded_tokens(batches)
+    unsorted_padded = padded_tokens([np.arange(start, min(start + batch_size, len(lengths)))
+                                     for start in range(0, len(lengths), batch_size)])
+    total_real = sum(real)
+
+    return {
+        'batches': [
+            {'size': len(batch), 'max_tokens': int(lengths[batch].max()),
+             'padding_ratio': round(1 - r / p, 4) if p else 0.0}
+            for batch, r, p in zip(batches, real, padded)
+        ],
+        'real_tokens': total_real,
+        'padded_tokens': sum(padded),
+        'padding_ratio': round(1 - total_real / sum(padded), 4) if padded else 0.0,
+        'unsorted_padded_tokens': sum(unsorted_padded),
+        'unsorted_padding_ratio': round(1 - total_real / sum(unsorted_padded), 4) if unsorted_padded else 0.0,
+        # Encoder cost scales at least linearly with padded tokens
+        'padded_token_savings': round(1 - sum(padded) / sum(unsorted_padded), 4) if unsorted_padded else 0.0,
+    }
+
+# Per-process model, set up by _init_worker
+_worker_model = None
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    """Pin thread counts before torch/onnxruntime load, then load the model"""
+    global _worker_model
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    Config.ONNX_THREADS = threads
+
+    from vector_store import get_embedding_model
+    _worker_model = get_embedding_model(model_name, backend=backend)
+    if backend == 'torch':
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                normalize_embeddings=True, show_progress_bar=False)
+
+class EmbeddingPool:
+    """Process pool that embeds chunks in parallel and keeps their order"""
+
+    def __init__(self, model_name: str, backend: str = None, workers: int = None, threads_per_worker: int = None):
+        self.model_name = model_name
+        self.backend = backend or Config.EMBEDDING_BACKEND
+        self.workers = workers or Config.EMBEDDING_WORKERS
+        self.threads_per_worker = threads_per_worker or Config.EMBEDDING_THREADS_PER_WORKER or \
+            max(1, (os.cpu_count() or 1) // self.workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_name, self.backend, self.threads_per_worker)
+        )
+
+    def encode(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """Embed texts across the workers; rows follow the input order"""
+        batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+        return self.encode_batches(texts, length_sorted_batches(texts, batch_size))
+
+    def encode_batches(self, texts: List[str], batches: List[np.ndarray]) -> np.ndarray:
+        """Embed precomputed index batches across the workers, in input order"""
+        print(f"Embedding {len(texts)} chunks in {len(batches)} batches on {self.workers} processes "
+              f"x {self.threads_per_worker} threads")
+
+        results = self.executor.map(_encode_batch, [[texts[i] for i in batch] for batch in batches])
+        embeddings = None
+        for batch, batch_embeddings in zip(batches, results):
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+            embeddings[batch] = batch_embeddings
+        return embeddings
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_embedding_pool(model_name: str, backend: str = None) -> EmbeddingPool:
+    """Shared pool per model; workers and their models persist across ingests"""
+    key = (model_name, backend or Config.EMBEDDING_BACKEND)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = EmbeddingPool(model_name, backend=key[1])
+            _pools[key] = pool
+    return pool
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown()
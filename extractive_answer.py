@@ -0,0 +1,114 @@
+"""
+Extractive fallback answering for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Used by gemini_rag and cloud_rag when no LLM is reachable. Sentences are
+tokenized once into sets, query terms are matched against the vocabulary
+(not every sentence word), and sentence scores are computed with NumPy as
+an IDF-weighted overlap, optionally scaled by the retrieval score of the
+chunk each sentence came from.
+"""
+
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+MAX_ANSWER_SENTENCES = 3
+MIN_PARTIAL_MATCH_LENGTH = 3
+
+def _as_chunks(context_chunks) -> List[Tuple[str, float]]:
+    """Accept chunk strings or enhanced_search results as (text, retrieval score)"""
+    chunks = []
+    for entry in context_chunks or []:
+        if isinstance(entry, str):
+            chunks.append((entry, 0.0))
+        else:
+            chunks.append((entry[0], float(entry[1]) if len(entry) > 1 else 0.0))
+    return chunks
+
+def split_sentences(chunks: List[Tuple[str, float]]) -> Tuple[List[str], np.ndarray]:
+    """Split chunks into sentences, returning them with their chunk's score"""
+    sentences = []
+    priors = []
+    for text, score in chunks:
+        for sentence in re.split(r'[.!?\n]+', text):
+            sentence = ' '.join(sentence.split())
+            if sentence:
+                sentences.append(sentence)
+                priors.append(score)
+    return sentences, np.asarray(priors, dtype=np.float32)
+
+def _term_weights(terms: np.ndarray, question_words: List[str]) -> np.ndarray:
+    """Weight each vocabulary term by how it matches the question words"""
+    weights = np.zeros(len(terms), dtype=np.float32)
+    long_terms = np.char.str_len(terms) >= MIN_PARTIAL_MATCH_LENGTH
+    for word in question_words:
+        exact = terms == word
+        # Partial matching (plural/stem variants): term contains word or word contains term
+        contains = np.char.find(terms, word) >= 0
+        substrings = {word[i:j] for i in range(len(word)) for j in range(i + MIN_PARTIAL_MATCH_LENGTH, len(word) + 1)}
+        contained = np.isin(terms, list(substrings)) & long_terms
+        weights += np.where(exact, 1.5, np.where(contains | contained, 0.5, 0.0))
+    return weights
+
+def score_sentences(sentences: List[str], question: str) -> np.ndarray:
+    """IDF-weighted overlap score of each sentence with the question"""
+    question_words = [word.strip('.,!?') for word in question.lower().split() if len(word) > 3]
+    if not sentences or not question_words:
+        return np.zeros(len(sentences), dtype=np.float32)
+
+    # Precompute each sentence's token set and a flat (sentence, term) incidence list
+    vocab = {}
+    rows = []
+    cols = []
+    lengths = np.empty(len(sentences), dtype=np.float32)
+    for i, sentence in enumerate(sentences):
+        tokens = set(re.findall(r'\w+', sentence.lower()))
+        lengths[i] = max(len(tokens), 1)
+        for token in tokens:
+            rows.append(i)
+            cols.append(vocab.setdefault(token, len(vocab)))
+
+    if not vocab:
+        return np.zeros(len(sentences), dtype=np.float32)
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    terms = np.array(list(vocab), dtype=str)
+
+    document_frequency = np.bincount(cols, minlength=len(terms))
+    idf = np.log((len(sentences) + 1) / (document_frequency + 1)) + 1.0
+    term_scores = _term_weights(terms, question_words) * idf
+
+    scores = np.bincount(rows, weights=term_scores[cols], minlength=len(sentences))
+    return (scores / np.sqrt(lengths)).astype(np.float32)
+
+def extractive_answer(context_chunks, question: str, top_n: int = MAX_ANSWER_SENTENCES) -> str:
+    """Answer by extracting the sentences that best match the question"""
+    chunks = _as_chunks(context_chunks)
+    context = ' '.join(text for text, score in chunks)
+
+    if not context.strip():
+        return "I don't have enough context to answer your question. Please upload a document first."
+
+    sentences, priors = split_sentences(chunks)
+    scores = score_sentences(sentences, question)
+
+    # Sentences from chunks the retriever ranked higher get a small boost
+    if priors.size and priors.max() > 0:
+        scores = scores * (1.0 + np.clip(priors, 0.0, None) / priors.max() * 0.25)
+
+    matched = np.flatnonzero(scores > 0)
+    if matched.size:
+        top_sentences = []
+        for i in matched[np.argsort(-scores[matched], kind='stable')]:
+            # Overlapping chunks repeat sentences; keep each one once
+            if sentences[i] not in top_sentences:
+                top_sentences.append(sentences[i])
+                if len(top_sentences) == top_n:
+                    break
+        return f"Based on the document: {'. '.join(top_sentences)}."
+    else:
+        return f"I found information in the document, but couldn't find a direct answer to your question. The document mainly discusses: {context[:200]}..."
@@ -1,47 +1,23 @@
 import os
 import requests
 import json
+import time
 from datetime import datetime
 
+from config import Config
+from context_packer import estimate_tokens, get_token_counter
+from extractive_answer import extractive_answer
+from rag_request import RAGRequest, render_prompt
+from summarizer import MapReduceSummarizer
+from telemetry import observe
+
 def get_simple_answer(context_chunks, question, chat_history=None):
-    """Enhanced rule-based answering with chat history awareness"""
-    context = ' '.join(context_chunks)
-    
-    # Simple keyword matching for demonstration
-    question_lower = question.lower()
-    
-    if not context.strip():
-        return "I don't have enough context to answer your question. Please upload a document first."
-    
-    # Extract relevant sentences with better scoring
-    sentences = context.split('.')
-    relevant_sentences = []
-    
-    # Enhanced keyword matching with stemming-like approach
-    question_words = [word.strip('.,!?') for word in question_lower.split() if len(word) > 3]
-    
-    for sentence in sentences:
-        sentence_lower = sentence.lower()
-        score = 0
-        for word in question_words:
-            if word in sentence_lower:
-                score += 1
-            # Partial matching for better coverage
-            for sent_word in sentence_lower.split():
-                if word in sent_word or sent_word in word:
-                    score += 0.5
-        
-        if score > 0:
-            relevant_sentences.append((sentence.strip(), score))
-    
-    # Sort by relevance score
-    relevant_sentences.sort(key=lambda x: x[1], reverse=True)
-    
-    if relevant_sentences:
-        top_sentences = [sent[0] for sent in relevant_sentences[:3]]
-        return f"Based on the document: {' '.join(top_sentences)}."
-    else:
-        return f"I found information in the document, but couldn't find a direct answer to your question. The document mainly discusses: {context[:200]}..."
+    """Rule-based answering used when no LLM is reachable.
+
+    context_chunks may be chunk strings or enhanced_search results; see
+    extractive_answer for the scoring.
+    """
+    return extractive_answer(context_chunks, question)
 
 def check_ollama_available():
     """Check if Ollama is running and what models are available"""
@@ -70,92 +46,163 @@ def check_ollama_available():
     except Exception as e:
         return False, f"Ollama connection failed: {str(e)}"
 
+def _ollama_generate(prompt, model_name, temperature, context=None):
+    """POST to /api/generate and return the final response with the full text.
+
+    The answer is streamed so time to first token can be measured; the
+    returned dict has the same fields as a non-streaming response.
+    """
+    payload = {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": True,
+        "keep_alive": Config.OLLAMA_KEEP_ALIVE,  # Keep the model (and its KV cache) resident between turns
+        "options": {
+            "temperature": temperature,
+            "num_predict": Config.LLM_MAX_ANSWER_TOKENS,  # Increased for more detailed responses
+            "top_k": 40,
+            "top_p": 0.9,
+            "repeat_penalty": 1.1,
+            "num_ctx": Config.LLM_CONTEXT_WINDOW  # Larger context window
+        }
+    }
+    if context:
+        payload["context"] = context
+
+    started = time.perf_counter()
+    response = requests.post(
+        "http://localhost:11434/api/generate",
+        json=payload,
+        stream=True,
+        timeout=180  # Longer timeout for complex questions
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+
+    pieces = []
+    result = {}
+    with response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            result = json.loads(line)
+            if result.get('error'):
+                raise RuntimeError(result['error'])
+            if result.get('response'):
+                if not pieces:
+                    observe('llm_ttft', time.perf_counter() - started)
+                pieces.append(result['response'])
+    observe('llm_total', time.perf_counter() - started)
+
+    result['response'] = ''.join(pieces)
+    return result
+
 def ask_ollama_local(prompt, model_name="mistral:latest", temperature=0.7):
     """Ask local Ollama model with enhanced parameters"""
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model_name,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": 800,  # Increased for more detailed responses
-                    "top_k": 40,
-                    "top_p": 0.9,
-                    "repeat_penalty": 1.1,
-                    "num_ctx": 4096  # Larger context window
-                }
-            },
-            timeout=180  # Longer timeout for complex questions
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('response', 'No response received').strip()
-        else:
-            return f"Error: HTTP {response.status_code}"
-            
+        result = _ollama_generate(prompt, model_name, temperature)
+        return result.get('response', 'No response received').strip()
+    except RuntimeError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
         return f"Error connecting to Ollama: {str(e)}"
 
-def build_enhanced_prompt(context_chunks, question, chat_history=None, document_metadata=None):
-    """Build an enhanced prompt with conversation history and metadata"""
-    context = '\n\n'.join(context_chunks)
-    
-    # Build chat history context
-    history_context = ""
-    if chat_history and len(chat_history) > 0:
-        history_context = "\n\nPrevious conversation:\n"
-        for i, (q, a) in enumerate(chat_history[-3:]):  # Last 3 exchanges
-            history_context += f"Q{i+1}: {q}\nA{i+1}: {a}\n"
-    
-    # Add document metadata if available
-    metadata_context = ""
-    if document_metadata:
-        metadata_context = f"\nDocument info: {document_metadata}\n"
-    
-    prompt = f"""You are an expert document analyst and question-answering assistant. Your job is to provide accurate, detailed, and helpful answers based on the provided document context.
+class OllamaSession:
+    """Per-conversation Ollama state for KV cache reuse across turns.
+
+    After each answer Ollama returns a `context` token array covering the
+    prompt and the response. Follow-up questions send only the new turn
+    together with that array, so the instructions, document info and earlier
+    turns are not prefilled again. The session falls back to a full prompt
+    when the document changes or the context window would overflow.
+    """
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+        self.context = None
+        self.system = None
+        self.turns = []
+
+    def reset(self):
+        """Forget cached context (new document or cleared chat)"""
+        self.context = None
+        self.system = None
+
+    def _can_reuse(self, sections, model_name):
+        if not self.context or self.system != sections.system or self.model_name != model_name:
+            return False
+        # Leave room for the new turn and the answer inside num_ctx
+        needed = len(self.context) + estimate_tokens(sections.turn) + Config.LLM_MAX_ANSWER_TOKENS
+        return needed <= Config.LLM_CONTEXT_WINDOW
+
+    def ask(self, sections, model_name, temperature=0.7):
+        """Answer one turn, reusing the previous context tokens when possible"""
+        reuse = self._can_reuse(sections, model_name)
+        prompt = sections.turn if reuse else sections.full
 
-INSTRUCTIONS:
-1. Use ONLY the information provided in the context below
-2. If the context doesn't contain enough information, clearly state what's missing
-3. Provide specific details and examples when available
-4. If this is a follow-up question, consider the previous conversation
-5. Structure your answer clearly with bullet points or numbered lists when appropriate
-6. Quote specific parts of the document when relevant
+        result = _ollama_generate(prompt, model_name, temperature, context=self.context if reuse else None)
 
-DOCUMENT CONTEXT:
-{context}{metadata_context}
-{history_context}
-CURRENT QUESTION: {question}
+        self.model_name = model_name
+        self.system = sections.system
+        self.context = result.get('context')
+        self._record_turn(result, reuse)
+        return result.get('response', 'No response received').strip()
 
-ANSWER: Provide a comprehensive, accurate answer based on the document context above. If you need to make any assumptions or if information is unclear, explicitly state this."""
+    def _record_turn(self, result, reused):
+        """Measure how much of the prompt was served from the KV cache"""
+        generated = result.get('eval_count', 0)
+        evaluated = result.get('prompt_eval_count', 0)
+        prompt_tokens = max(len(result.get('context') or []) - generated, evaluated)
+        prefill_ms = result.get('prompt_eval_duration', 0) / 1e6
+        per_token_ms = prefill_ms / evaluated if evaluated else 0.0
+        cached = max(prompt_tokens - evaluated, 0)
+
+        turn = {
+            'mode': 'incremental' if reused else 'full',
+            'prompt_tokens': prompt_tokens,
+            'evaluated_tokens': evaluated,
+            'cached_tokens': cached,
+            'prefill_ms': round(prefill_ms, 1),
+            'prefill_ms_saved': round(cached * per_token_ms, 1),
+        }
+        self.turns.append(turn)
+        print(f"Ollama prefill: {evaluated}/{prompt_tokens} tokens evaluated "
+              f"({turn['mode']}, ~{turn['prefill_ms_saved']:.0f} ms saved)")
+
+    def stats(self):
+        """Aggregate prefill savings over the conversation"""
+        prompt_tokens = sum(turn['prompt_tokens'] for turn in self.turns)
+        cached = sum(turn['cached_tokens'] for turn in self.turns)
+        return {
+            'turns': len(self.turns),
+            'prompt_tokens': prompt_tokens,
+            'cached_tokens': cached,
+            'prefill_saved_ratio': cached / prompt_tokens if prompt_tokens else 0.0,
+            'prefill_ms': round(sum(turn['prefill_ms'] for turn in self.turns), 1),
+            'prefill_ms_saved': round(sum(turn['prefill_ms_saved'] for turn in self.turns), 1),
+        }
+
+def build_prompt_sections(context_chunks, question, chat_history=None, document_metadata=None, model_name=None):
+    """Build the prompt as cacheable sections (see PromptSections)"""
+    request = RAGRequest(question, context_chunks, chat_history or [], document_metadata)
+    return render_prompt(request, model_name)
+
+def build_enhanced_prompt(context_chunks, question, chat_history=None, document_metadata=None, model_name=None):
+    """Build an enhanced prompt with conversation history and metadata"""
+    return build_prompt_sections(context_chunks, question, chat_history, document_metadata, model_name).full
 
-    return prompt
+def ask_smart_llm(request, chat_history=None, model_preference="balanced", session=None):
+    """Enhanced LLM interaction with multiple strategies.
+
+    request is a RAGRequest; the prompt is rendered here, once, for the
+    selected model. A plain prompt string is still accepted but then the
+    rule-based fallback has no context to work with. With an OllamaSession,
+    follow-up questions reuse the cached conversation context.
+    """
+    if isinstance(request, str):
+        request = RAGRequest(question="", history=chat_history or [], raw_prompt=request)
 
-def ask_smart_llm(prompt, chat_history=None, model_preference="balanced"):
-    """Enhanced LLM interaction with multiple strategies"""
     try:
-        # Extract question and context from prompt for fallback
-        lines = prompt.split('\n')
-        question = ""
-        context_chunks = []
-        
-        for i, line in enumerate(lines):
-            if line.startswith("CURRENT QUESTION:"):
-                question = line.replace("CURRENT QUESTION:", "").strip()
-            elif line.startswith("DOCUMENT CONTEXT:"):
-                # Find context section
-                context_start = i + 1
-                context_lines = []
-                for j in range(context_start, len(lines)):
-                    if lines[j].startswith("CURRENT QUESTION:"):
-                        break
-                    context_lines.append(lines[j])
-                context_chunks = ['\n'.join(context_lines)]
-        
         # Check if Ollama is available
         is_available, status = check_ollama_available()
         
@@ -163,26 +210,47 @@ def ask_smart_llm(prompt, chat_history=None, model_preference="balanced"):
             print(f"Using model: {status}")
             
             # Adjust temperature based on question type
-            temperature = 0.3  # Lower for factual questions
-            if any(word in question.lower() for word in ['explain', 'describe', 'how', 'why', 'what']):
-                temperature = 0.7  # Higher for explanatory questions
+            temperature = request.choose_temperature()
+            sections = render_prompt(request, status)
             
-            response = ask_ollama_local(prompt, status, temperature)
+            if session is not None:
+                try:
+                    response = session.ask(sections, status, temperature)
+                except Exception as e:
+                    session.reset()
+                    response = f"Error connecting to Ollama: {str(e)}"
+            else:
+                response = ask_ollama_local(sections.full, status, temperature)
             
             if not response.startswith("Error"):
                 return response
             else:
                 print(f"Ollama error: {response}")
-                return get_simple_answer(context_chunks, question, chat_history)
+                return get_simple_answer(request.chunks, request.question, request.history)
         else:
             print(f"Ollama status: {status}")
-            return get_simple_answer(context_chunks, question, chat_history)
+            return get_simple_answer(request.chunks, request.question, request.history)
             
     except Exception as e:
         print(f"Error in ask_smart_llm: {e}")
-        context_chunks = context_chunks if 'context_chunks' in locals() else [""]
-        question = question if 'question' in locals() else "your question"
-        return get_simple_answer(context_chunks, question, chat_history)
+        return get_simple_answer(request.chunks, request.question or "your question", request.history)
+
+def summarize_document(question, chunks, chunk_metadata=None):
+    """Answer a whole-document question by map-reduce over all chunks (see summarizer)"""
+    try:
+        is_available, status = check_ollama_available()
+        if not is_available:
+            print(f"Ollama status: {status}")
+            return get_simple_answer(chunks, question)
+
+        print(f"Using model: {status} (map-reduce over {len(chunks)} chunks)")
+        summarizer = MapReduceSummarizer(
+            lambda prompt: _ollama_generate(prompt, status, 0.3)['response'],
+            status, count_tokens=get_token_counter(status))
+        return summarizer.answer(question, chunks, chunk_metadata)
+    except Exception as e:
+        print(f"Error in summarize_document: {e}")
+        return get_simple_answer(chunks, question)
 
 def analyze_document_content(text_chunks):
     """Analyze document to provide metadata for better prompting"""
@@ -0,0 +1,101 @@
+"""
+Import-time profiler for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Runs `python -X importtime` for each application module in a fresh
+interpreter and reports the slowest imports and any heavy dependency that
+was pulled in eagerly. Use --budget-ms in CI to catch cold-start regressions.
+
+Usage:
+    python import_profile.py
+    python import_profile.py vector_store pdf_utils --top 15 --json import_profile.json
+    python import_profile.py --budget-ms 300
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+DEFAULT_MODULES = ['config', 'pdf_utils', 'vector_store', 'gemini_rag']
+
+# Modules that must only be loaded on first use
+HEAVY_MODULES = ['torch', 'transformers', 'sentence_transformers', 'faiss',
+                 'cv2', 'pytesseract', 'PIL', 'fitz', 'openai']
+
+def profile_module(module: str) -> Dict:
+    """Import `module` in a fresh interpreter and parse -X importtime output"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            _, timings = line.split(':', 1)
+            self_us, cumulative_us, name = timings.split('|')
+            imports.append({
+                'module': name.strip(),
+                'self_ms': int(self_us) / 1000,
+                'cumulative_ms': int(cumulative_us) / 1000,
+            })
+        except ValueError:
+            continue
+
+    own = [entry for entry in imports if entry['module'] == module]
+    total_ms = own[-1]['cumulative_ms'] if own else sum(entry['self_ms'] for entry in imports)
+    loaded = {entry['module'] for entry in imports}
+    eager_heavy = sorted(name for name in HEAVY_MODULES if name in loaded)
+
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr.strip() else "",
+        'total_ms': round(total_ms, 1),
+        'eager_heavy_modules': eager_heavy,
+        'imports': imports,
+    }
+
+def print_report(reports: List[Dict], top: int):
+    """Print a human-readable import-time report"""
+    for report in reports:
+        status = "" if report['ok'] else f"  (import failed: {report['error']})"
+        print(f"\n=== {report['module']}: {report['total_ms']:.1f} ms{status}")
+        if report['eager_heavy_modules']:
+            print(f"    Heavy modules imported eagerly: {', '.join(report['eager_heavy_modules'])}")
+
+        slowest = sorted(report['imports'], key=lambda entry: entry['self_ms'], reverse=True)[:top]
+        for entry in slowest:
+            print(f"    {entry['self_ms']:9.1f} ms self  {entry['cumulative_ms']:9.1f} ms cum  {entry['module']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Report import time of the RAG Assistant modules")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help="Modules to profile")
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to show")
+    parser.add_argument('--json', dest='json_path', help="Write the full report to this JSON file")
+    parser.add_argument('--budget-ms', type=float, help="Exit non-zero if any module exceeds this import time")
+    args = parser.parse_args()
+
+    reports = [profile_module(module) for module in args.modules]
+    print_report(reports, args.top)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\nFull report written to {args.json_path}")
+
+    failed = [r for r in reports if r['eager_heavy_modules']]
+    if args.budget_ms is not None:
+        failed += [r for r in reports if r['total_ms'] > args.budget_ms]
+    if failed:
+        print(f"\nImport-time regressions in: {', '.join(sorted({r['module'] for r in failed}))}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
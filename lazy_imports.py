@@ -0,0 +1,74 @@
+"""
+Lazy module loading for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Heavy dependencies (faiss, sentence-transformers/torch, OpenCV, Tesseract)
+are wrapped in proxies that import the real module on first attribute access,
+so the Streamlit UI can render before any of them are loaded.
+"""
+
+import importlib
+import importlib.util
+import threading
+from types import ModuleType
+from typing import Callable, Optional
+
+
+class LazyModule(ModuleType):
+    """Module proxy that imports the target module on first use"""
+
+    def __init__(self, name: str, on_load: Optional[Callable[[ModuleType], None]] = None):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_on_load'] = on_load
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is not None:
+            return module
+
+        with self.__dict__['_lazy_lock']:
+            module = self.__dict__['_lazy_module']
+            if module is None:
+                module = importlib.import_module(self.__dict__['_lazy_name'])
+                on_load = self.__dict__['_lazy_on_load']
+                if on_load is not None:
+                    on_load(module)
+                self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__['_lazy_module'] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+
+def lazy_import(name: str, on_load: Optional[Callable[[ModuleType], None]] = None) -> LazyModule:
+    """Return a proxy for `name` that is imported on first attribute access"""
+    return LazyModule(name, on_load=on_load)
+
+
+def is_loaded(module) -> bool:
+    """Check whether a lazy proxy has already imported its module"""
+    if isinstance(module, LazyModule):
+        return module.__dict__['_lazy_module'] is not None
+    return True
+
+
+def module_available(name: str) -> bool:
+    """Check if a module can be imported without actually importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
@@ -1,11 +1,17 @@
 import streamlit as st
 import os
 from datetime import datetime
-from pdf_utils import extract_text_from_pdf, extract_text_from_image_file, chunk_text, check_ocr_setup, get_ocr_install_instructions
+from pdf_utils import extract_text_from_pdf, extract_text_from_image_file, chunk_text, check_ocr_setup, get_ocr_install_instructions, upload_source
 from vector_store import EnhancedVectorStore
+from config import Config
+from conversation_store import Conversation
+from rag_request import RAGRequest
+from summarizer import is_whole_document_question
+from telemetry import trace
+from profiling import profile_run
 
 # Import cloud_rag for OpenAI integration
-from cloud_rag import build_enhanced_prompt, ask_smart_llm, analyze_document_content, check_openai_available
+from cloud_rag import ask_smart_llm, analyze_document_content, summarize_document, check_openai_available
 
 # Try to import OCR utilities with fallback
 try:
@@ -168,6 +174,19 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def render_exchange(question: str, answer: str):
+    st.markdown(f"""
+    <div class="chat-message user-message">
+        <strong>🙋 You:</strong> {question}
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(f"""
+    <div class="chat-message assistant-message">
+        <strong>🤖 Assistant:</strong> {answer}
+    </div>
+    """, unsafe_allow_html=True)
+
 # Professional Header
 st.markdown('<h1 class="main-header">🧠 Intelligent RAG Assistant</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Advanced Document Analysis & Q&A System</p>', unsafe_allow_html=True)
@@ -218,7 +237,7 @@ with st.sidebar:
                            help="Higher values make responses more creative but less precise")
     
     if st.button("🗑️ Clear Chat History"):
-        st.session_state['chat_history'] = []
+        st.session_state['conversation'].clear()
         st.rerun()
 
 # Initialize session state
@@ -227,8 +246,10 @@ if 'vector_store' not in st.session_state:
     st.session_state['chunks'] = []
     st.session_state['file_uploaded'] = False
     st.session_state['file_type'] = None
-    st.session_state['chat_history'] = []
     st.session_state['document_metadata'] = None
+if 'conversation' not in st.session_state:
+    # Turns live in SQLite; only the last HISTORY_WINDOW exchanges stay in memory
+    st.session_state['conversation'] = Conversation()
 
 # Main content area
 col1, col2 = st.columns([2, 1])
@@ -240,25 +261,25 @@ with col1:
         
         with st.spinner(f"🔄 Processing {file_name}..."):
             try:
-                # Save uploaded file temporarily
-                temp_path = "temp_file.pdf"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.read())
-                
-                # Extract text from PDF
-                st.info("📄 Processing PDF...")
-                text = extract_pdf_text_simple(temp_path)
+                # Read the upload from memory; only large files spill to a unique temp file
+                with upload_source(uploaded_file, suffix=".pdf") as source, profile_run('ingest_extraction'):
+                    # Extract text from PDF
+                    st.info("📄 Processing PDF...")
+                    text = extract_text_from_pdf(source, use_ocr=False)
                 st.session_state['file_type'] = "PDF"
                 
                 if not text.strip() or text.startswith("Error"):
                     st.error("❌ No text could be extracted from the file.")
                 else:
-                    # Process the extracted text with chunking
-                    chunks = simple_chunk_text(text, chunk_size=400, overlap=100)
-                    st.session_state['chunks'] = chunks
-                    st.session_state['vector_store'] = EnhancedVectorStore()
-                    st.session_state['vector_store'].add_chunks(chunks)
-                    st.session_state['vector_store'].save(chunks)
+                    with profile_run('ingest_indexing'):
+                        # Process the extracted text with chunking
+                        chunks = chunk_text(text, chunk_size=400, overlap=100)
+                        if st.session_state['vector_store'] is not None:
+                            st.session_state['vector_store'].close()
+                        st.session_state['vector_store'] = EnhancedVectorStore()
+                        st.session_state['vector_store'].add_chunks(chunks)
+                        st.session_state['vector_store'].save()
+                        st.session_state['chunks'] = st.session_state['vector_store'].chunks
                     st.session_state['file_uploaded'] = True
                     
                     # Analyze document content
@@ -278,36 +299,26 @@ with col1:
                             st.metric("Avg Chunk Size", f"{doc_summary['avg_chunk_size']} words")
                         
                         st.write(f"**Document Type:** {st.session_state['document_metadata']['type'].title()}")
-                
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
                     
             except Exception as e:
                 st.error(f"❌ Error processing file: {str(e)}")
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
 
     # Chat Interface
     if st.session_state['file_uploaded']:
         st.divider()
         st.subheader("💬 Chat with your Document")
         
-        # Display chat history
-        if st.session_state['chat_history']:
+        # Display chat history: the recent window, earlier turns paged in from disk on request
+        conversation = st.session_state['conversation']
+        if conversation.total:
             st.markdown("### Conversation History")
-            for i, (question, answer) in enumerate(st.session_state['chat_history']):
-                st.markdown(f"""
-                <div class="chat-message user-message">
-                    <strong>🙋 You:</strong> {question}
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                <div class="chat-message assistant-message">
-                    <strong>🤖 Assistant:</strong> {answer}
-                </div>
-                """, unsafe_allow_html=True)
+            if conversation.earlier_count and st.checkbox(f"Show {conversation.earlier_count} earlier exchanges"):
+                pages = -(-conversation.earlier_count // Config.HISTORY_PAGE_SIZE)
+                page = st.number_input("Page", min_value=1, max_value=pages, value=pages) if pages > 1 else 1
+                for question, answer in conversation.page(page - 1):
+                    render_exchange(question, answer)
+            for question, answer in conversation.recent:
+                render_exchange(question, answer)
         
         # Question input
         st.markdown("### Ask a Question")
@@ -348,37 +359,36 @@ with col1:
         if ask_button and question.strip():
             with st.spinner("🧠 Analyzing document and generating response..."):
                 try:
-                    # Enhanced search
-                    search_results = st.session_state['vector_store'].enhanced_search(question, top_k=search_k)
-                    context_chunks = [chunk for chunk, score, metadata in search_results]
-                    
-                    # Build enhanced prompt
-                    prompt = build_enhanced_prompt(
-                        context_chunks, 
-                        question, 
-                        chat_history=st.session_state['chat_history'][-3:],
-                        document_metadata=st.session_state['document_metadata']
-                    )
-                    
-                    # Get AI response
-                    answer = ask_smart_llm(prompt, st.session_state['chat_history'])
+                    # Time each pipeline stage for the sidebar breakdown
+                    with trace('question') as question_trace, profile_run('question'):
+                        store = st.session_state['vector_store']
+                        # Whole-document questions read every chunk (map-reduce); the rest use the retrieved ones
+                        if Config.SUMMARY_MODE and is_whole_document_question(question):
+                            search_results = []
+                            answer = summarize_document(question, store.chunks, store.chunk_metadata)
+                        else:
+                            # Enhanced search
+                            search_results = store.enhanced_search(question, top_k=search_k)
+                            
+                            # Structured request: question, chunks, history and metadata
+                            request = RAGRequest(
+                                question=question,
+                                chunks=search_results,
+                                history=st.session_state['conversation'].prompt_history(),
+                                metadata=st.session_state['document_metadata']
+                            )
+                            
+                            # Get AI response (the prompt is rendered for the selected model)
+                            answer = ask_smart_llm(request)
+                        
+                    st.session_state['last_timings'] = (question_trace.breakdown(), question_trace.total_ms)
                     
                     # Add to chat history
-                    st.session_state['chat_history'].append((question, answer))
+                    st.session_state['conversation'].append(question, answer)
                     
                     # Display the new answer
                     st.markdown("### 🎯 Latest Response")
-                    st.markdown(f"""
-                    <div class="chat-message user-message">
-                        <strong>🙋 You:</strong> {question}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message">
-                        <strong>🤖 Assistant:</strong> {answer}
-                    </div>
-                    """, unsafe_allow_html=True)
+                    render_exchange(question, answer)
                     
                     # Clear current question
                     if 'current_question' in st.session_state:
@@ -396,6 +406,12 @@ with col2:
         ai_model_display = status.split(':')[0] if ':' in status else status
         st.metric("AI Model", ai_model_display)
         st.metric("Context Size", f"{search_k} chunks")
+        
+        if st.session_state.get('last_timings'):
+            timings, total_ms = st.session_state['last_timings']
+            with st.expander(f"⏱️ Last Question: {total_ms / 1000:.2f}s", expanded=False):
+                for stage, ms in timings.items():
+                    st.caption(f"{stage.replace('_', ' ').title()}: {ms:.0f} ms")
 
 # Footer
 st.markdown("""
@@ -1,9 +1,19 @@
 import streamlit as st
 import os
 from datetime import datetime
-from pdf_utils import extract_text_from_pdf, extract_text_from_image_file, chunk_text, check_ocr_setup, get_ocr_install_instructions
-from vector_store import EnhancedVectorStore
-from gemini_rag import build_enhanced_prompt, ask_smart_llm, analyze_document_content
+from pdf_utils import extract_pages_from_pdf, join_pages, page_word_starts, extract_text_from_image_file, chunk_text_with_offsets, check_ocr_setup, get_ocr_install_instructions, upload_source
+from vector_store import EnhancedVectorStore, warm_up
+from gemini_rag import ask_smart_llm, analyze_document_content, summarize_document, OllamaSession
+from config import Config
+from conversation_store import Conversation
+from rag_request import RAGRequest
+from summarizer import is_whole_document_question
+from telemetry import trace
+from profiling import profile_run
+
+# Load the embedding model in the background while the UI renders
+if Config.WARMUP_ON_START:
+    warm_up(Config.EMBEDDING_MODEL)
 
 # Enhanced page configuration
 st.set_page_config(
@@ -163,6 +173,19 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def render_exchange(question: str, answer: str):
+    st.markdown(f"""
+    <div class="chat-message user-message" style="color: #1565c0 !important;">
+        <strong style="color: #0d47a1 !important;">🙋 You:</strong> <span style="color: #1565c0 !important;">{question}</span>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(f"""
+    <div class="chat-message assistant-message" style="color: #2c3e50 !important;">
+        <strong style="color: #1b5e20 !important;">🤖 Assistant:</strong> <span style="color: #2c3e50 !important;">{answer}</span>
+    </div>
+    """, unsafe_allow_html=True)
+
 # Professional Header
 st.markdown('<h1 class="main-header">🧠 Intelligent RAG Assistant</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Advanced Document Analysis & Q&A System</p>', unsafe_allow_html=True)
@@ -220,7 +243,9 @@ with st.sidebar:
                            help="Higher values make responses more creative but less precise")
     
     if st.button("🗑️ Clear Chat History"):
-        st.session_state['chat_history'] = []
+        st.session_state['conversation'].clear()
+        if 'ollama_session' in st.session_state:
+            st.session_state['ollama_session'].reset()
         st.rerun()
 
 # Initialize session state
@@ -229,8 +254,12 @@ if 'vector_store' not in st.session_state:
     st.session_state['chunks'] = []
     st.session_state['file_uploaded'] = False
     st.session_state['file_type'] = None
-    st.session_state['chat_history'] = []
     st.session_state['document_metadata'] = None
+if 'conversation' not in st.session_state:
+    # Turns live in SQLite; only the last HISTORY_WINDOW exchanges stay in memory
+    st.session_state['conversation'] = Conversation()
+if 'ollama_session' not in st.session_state:
+    st.session_state['ollama_session'] = OllamaSession()
 
 # Main content area
 col1, col2 = st.columns([2, 1])
@@ -243,36 +272,40 @@ with col1:
         
         with st.spinner(f"🔄 Processing {file_name}..."):
             try:
-                # Save uploaded file temporarily
-                temp_path = os.path.join("temp_file")
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.read())
-                
-                # Extract text based on file type
-                if file_type == "application/pdf":
-                    st.info("📄 Processing PDF (with OCR for scanned pages if available)...")
-                    text = extract_text_from_pdf(temp_path, use_ocr=ocr_available)
-                    st.session_state['file_type'] = "PDF"
-                else:  # Image files
-                    if ocr_available:
-                        st.info("📷 Processing image with OCR...")
-                        text = extract_text_from_image_file(temp_path)
-                        st.session_state['file_type'] = "Image"
-                    else:
-                        st.error("❌ OCR not available. Cannot process image files.")
-                        text = ""
+                # Read the upload from memory; only large files spill to a unique temp file
+                extension = os.path.splitext(file_name)[1].lower()
+                page_starts = None
+                with upload_source(uploaded_file, suffix=extension) as source, profile_run('ingest_extraction'):
+                    # Extract text based on file type
+                    if file_type == "application/pdf":
+                        st.info("📄 Processing PDF (with OCR for scanned pages if available)...")
+                        pages = extract_pages_from_pdf(source, use_ocr=ocr_available)
+                        text, page_starts = join_pages(pages), page_word_starts(pages)
+                        st.session_state['file_type'] = "PDF"
+                    else:  # Image files
+                        if ocr_available:
+                            st.info("📷 Processing image with OCR...")
+                            text = extract_text_from_image_file(source)
+                            st.session_state['file_type'] = "Image"
+                        else:
+                            st.error("❌ OCR not available. Cannot process image files.")
+                            text = ""
                 
                 if not text.strip():
                     st.error("❌ No text could be extracted from the file.")
                 elif text.startswith("OCR not available") or text.startswith("OCR Error"):
                     st.error(f"❌ {text}")
                 else:
-                    # Process the extracted text with enhanced chunking
-                    chunks = chunk_text(text, chunk_size=400, overlap=100)  # Better overlap
-                    st.session_state['chunks'] = chunks
-                    st.session_state['vector_store'] = EnhancedVectorStore()
-                    st.session_state['vector_store'].add_chunks(chunks)
-                    st.session_state['vector_store'].save(chunks)
+                    with profile_run('ingest_indexing'):
+                        # Process the extracted text with enhanced chunking
+                        chunked = chunk_text_with_offsets(text, chunk_size=400, overlap=100)  # Better overlap
+                        chunks = [chunk for chunk, start, end in chunked]
+                        if st.session_state['vector_store'] is not None:
+                            st.session_state['vector_store'].close()
+                        st.session_state['vector_store'] = EnhancedVectorStore(Config.EMBEDDING_MODEL)
+                        st.session_state['vector_store'].add_chunks(chunks, [(start, end) for chunk, start, end in chunked], page_starts)
+                        st.session_state['vector_store'].save()
+                        st.session_state['chunks'] = st.session_state['vector_store'].chunks
                     st.session_state['file_uploaded'] = True
                     
                     # Analyze document content
@@ -287,7 +320,9 @@ with col1:
                         with col_a:
                             st.metric("Total Words", doc_summary['total_words'])
                         with col_b:
-                            st.metric("Chunks Created", doc_summary['total_chunks'])
+                            removed = doc_summary['duplicate_chunks_removed']
+                            st.metric("Chunks Created", doc_summary['total_chunks'],
+                                      delta=f"-{removed} duplicates" if removed else None, delta_color="off")
                         with col_c:
                             st.metric("Avg Chunk Size", f"{doc_summary['avg_chunk_size']} words")
                         
@@ -298,36 +333,26 @@ with col1:
                             st.write(f"📅 Contains dates ({doc_summary['chunks_with_dates']} chunks)")
                         if doc_summary['chunks_with_money'] > 0:
                             st.write(f"💰 Contains financial information ({doc_summary['chunks_with_money']} chunks)")
-                
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
                     
             except Exception as e:
                 st.error(f"❌ Error processing file: {str(e)}")
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
 
     # Chat Interface
     if st.session_state['file_uploaded']:
         st.divider()
         st.subheader("💬 Chat with your Document")
         
-        # Display chat history
-        if st.session_state['chat_history']:
+        # Display chat history: the recent window, earlier turns paged in from disk on request
+        conversation = st.session_state['conversation']
+        if conversation.total:
             st.markdown("### Conversation History")
-            for i, (question, answer) in enumerate(st.session_state['chat_history']):
-                st.markdown(f"""
-                <div class="chat-message user-message" style="color: #1565c0 !important;">
-                    <strong style="color: #0d47a1 !important;">🙋 You:</strong> <span style="color: #1565c0 !important;">{question}</span>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                <div class="chat-message assistant-message" style="color: #2c3e50 !important;">
-                    <strong style="color: #1b5e20 !important;">🤖 Assistant:</strong> <span style="color: #2c3e50 !important;">{answer}</span>
-                </div>
-                """, unsafe_allow_html=True)
+            if conversation.earlier_count and st.checkbox(f"Show {conversation.earlier_count} earlier exchanges"):
+                pages = -(-conversation.earlier_count // Config.HISTORY_PAGE_SIZE)
+                page = st.number_input("Page", min_value=1, max_value=pages, value=pages) if pages > 1 else 1
+                for question, answer in conversation.page(page - 1):
+                    render_exchange(question, answer)
+            for question, answer in conversation.recent:
+                render_exchange(question, answer)
         
         # Question input with suggestions
         st.markdown("### Ask a Question")
@@ -393,58 +418,60 @@ with col1:
         if ask_button and question.strip():
             with st.spinner("🧠 Analyzing document and generating response..."):
                 try:
-                    # Enhanced search with metadata
-                    search_results = st.session_state['vector_store'].enhanced_search(question, top_k=search_k)
-                    context_chunks = [chunk for chunk, score, metadata in search_results]
-                    
-                    # Build enhanced prompt with chat history
-                    prompt = build_enhanced_prompt(
-                        context_chunks, 
-                        question, 
-                        chat_history=st.session_state['chat_history'][-3:],  # Last 3 exchanges
-                        document_metadata=st.session_state['document_metadata']
-                    )
-                    
-                    # Get AI response
-                    answer = ask_smart_llm(prompt, st.session_state['chat_history'])
+                    # Time each pipeline stage for the sidebar breakdown
+                    with trace('question') as question_trace, profile_run('question'):
+                        store = st.session_state['vector_store']
+                        # Whole-document questions read every chunk (map-reduce); the rest use the retrieved ones
+                        if Config.SUMMARY_MODE and is_whole_document_question(question):
+                            search_results = []
+                            answer = summarize_document(question, store.chunks, store.chunk_metadata)
+                        else:
+                            # Enhanced search with metadata
+                            search_results = store.enhanced_search(question, top_k=search_k)
+                            
+                            # Structured request: question, chunks, history and metadata
+                            request = RAGRequest(
+                                question=question,
+                                chunks=search_results,
+                                history=st.session_state['conversation'].prompt_history(),
+                                metadata=st.session_state['document_metadata']
+                            )
+                            
+                            # Get AI response (the prompt is rendered for the selected model)
+                            answer = ask_smart_llm(request, session=st.session_state['ollama_session'])
+                        
+                    st.session_state['last_timings'] = (question_trace.breakdown(), question_trace.total_ms)
                     
                     # Add to chat history
-                    st.session_state['chat_history'].append((question, answer))
+                    st.session_state['conversation'].append(question, answer)
                     
                     # Display the new answer
                     st.markdown("### 🎯 Latest Response")
-                    st.markdown(f"""
-                    <div class="chat-message user-message" style="color: #1565c0 !important;">
-                        <strong style="color: #0d47a1 !important;">🙋 You:</strong> <span style="color: #1565c0 !important;">{question}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message" style="color: #2c3e50 !important;">
-                        <strong style="color: #1b5e20 !important;">🤖 Assistant:</strong> <span style="color: #2c3e50 !important;">{answer}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    render_exchange(question, answer)
                     
                     # Clear current question
                     if 'current_question' in st.session_state:
                         del st.session_state['current_question']
                     
                     # Show sources with enhanced information
-                    with st.expander("📚 Sources & Confidence", expanded=False):
-                        for i, (chunk, score, metadata) in enumerate(search_results):
-                            relevance = "High" if score > 0.8 else "Medium" if score > 0.6 else "Low"
-                            st.markdown(f"**Source {i+1}** (Relevance: {relevance}, Score: {score:.3f})")
-                            
-                            # Show metadata insights
-                            if metadata:
-                                insights = []
-                                if metadata.get('has_numbers'): insights.append("📊 Contains numbers")
-                                if metadata.get('has_dates'): insights.append("📅 Contains dates")
-                                if metadata.get('has_money'): insights.append("💰 Contains financial info")
-                                if insights:
-                                    st.caption(" | ".join(insights))
-                            
-                            st.text_area(f"Content {i+1}:", chunk, height=100, key=f"source_{i}")
+                    if not search_results:
+                        st.caption("📚 Answered from the whole document (summaries of all chunks), not from top matches")
+                    else:
+                        with st.expander("📚 Sources & Confidence", expanded=False):
+                            for i, (chunk, score, metadata) in enumerate(search_results):
+                                relevance = "High" if score > 0.8 else "Medium" if score > 0.6 else "Low"
+                                st.markdown(f"**Source {i+1}** (Relevance: {relevance}, Score: {score:.3f})")
+                                
+                                # Show metadata insights
+                                if metadata:
+                                    insights = []
+                                    if metadata.get('has_numbers'): insights.append("📊 Contains numbers")
+                                    if metadata.get('has_dates'): insights.append("📅 Contains dates")
+                                    if metadata.get('has_money'): insights.append("💰 Contains financial info")
+                                    if insights:
+                                        st.caption(" | ".join(insights))
+                                
+                                st.text_area(f"Content {i+1}:", chunk, height=100, key=f"source_{i}")
                     
                 except Exception as e:
                     st.error(f"❌ Error generating response: {str(e)}")
@@ -464,18 +491,29 @@ with col2:
         st.metric("AI Model", status.split(':')[0] if ':' in status else status)
         st.metric("Context Size", f"{search_k} chunks", help="Number of relevant chunks used")
         
+        session_stats = st.session_state['ollama_session'].stats()
+        if session_stats['turns'] > 1:
+            st.metric("Prefill Reused", f"{session_stats['prefill_saved_ratio']:.0%}",
+                      help=f"Prompt tokens served from Ollama's KV cache (~{session_stats['prefill_ms_saved'] / 1000:.1f}s saved)")
+        
+        if st.session_state.get('last_timings'):
+            timings, total_ms = st.session_state['last_timings']
+            with st.expander(f"⏱️ Last Question: {total_ms / 1000:.2f}s", expanded=False):
+                for stage, ms in timings.items():
+                    st.caption(f"{stage.replace('_', ' ').title()}: {ms:.0f} ms")
+        
+        cache_stats = st.session_state['vector_store'].cache_stats()
+        if cache_stats['embeddings']['hits']:
+            st.metric("Query Cache Hits", f"{cache_stats['embeddings']['hit_ratio']:.0%}",
+                      help="Repeated questions reuse their embedding and search results")
+        
         # Export chat history
-        if st.session_state['chat_history']:
+        if st.session_state['conversation'].total:
             st.markdown("### 💾 Export Chat")
             if st.button("📥 Download Conversation"):
-                chat_export = []
-                for q, a in st.session_state['chat_history']:
-                    chat_export.append(f"Q: {q}\nA: {a}\n" + "="*50 + "\n")
-                
-                export_text = f"Chat Export - {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n" + "\n".join(chat_export)
                 st.download_button(
                     label="Download as TXT",
-                    data=export_text,
+                    data="".join(st.session_state['conversation'].export_lines()),
                     file_name=f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M')}.txt",
                     mime="text/plain"
                 )
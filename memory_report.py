@@ -0,0 +1,50 @@
+"""
+Process memory accounting for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Separates private (anonymous) memory from file-backed mappings, so a
+memory-mapped FAISS index shows up as mapped/shared page cache rather than
+as per-process heap. Reads /proc and reports None elsewhere.
+"""
+
+import os
+from typing import Dict, Iterable, Optional
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Resident set of this process in KiB: total, anonymous (private heap) and file-backed"""
+    fields = {'VmRSS': 'rss_kb', 'RssAnon': 'rss_anon_kb', 'RssFile': 'rss_file_kb', 'RssShmem': 'rss_shmem_kb'}
+    report = dict.fromkeys(fields.values())
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key = line.split(':', 1)[0]
+                if key in fields:
+                    report[fields[key]] = int(line.split()[1])
+    except OSError:
+        pass
+    return report
+
+def mapped_memory(paths: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Mapped size and resident part (KiB) of this process's mappings of the given files"""
+    targets = {os.path.realpath(path) for path in paths}
+    report = {'mapped_kb': None, 'mapped_resident_kb': None}
+    try:
+        with open('/proc/self/smaps') as f:
+            mapped = resident = 0
+            current = False
+            for line in f:
+                parts = line.split()
+                if not parts:
+                    continue
+                if not parts[0].endswith(':'):
+                    # Mapping header: address perms offset dev inode [path]
+                    current = len(parts) >= 6 and parts[5] in targets
+                elif current and parts[0] == 'Size:':
+                    mapped += int(parts[1])
+                elif current and parts[0] == 'Rss:':
+                    resident += int(parts[1])
+        report.update(mapped_kb=mapped, mapped_resident_kb=resident)
+    except OSError:
+        pass
+    return report
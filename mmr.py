@@ -0,0 +1,49 @@
+"""
+Maximal marginal relevance for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Overlapping chunks of the same passage embed almost identically, so the
+plain top-k often spends the whole context window on one passage. MMR picks
+results one at a time, trading relevance against similarity to what has
+already been picked:
+
+    score(c) = lambda * relevance(c) - (1 - lambda) * max_sim(c, selected)
+
+Similarities come from the candidates' stored embeddings (no re-encoding)
+and the selection is a vectorized NumPy loop over the shortlist.
+"""
+
+from typing import List
+
+import numpy as np
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float = 0.7,
+               duplicate_threshold: float = 1.0) -> List[int]:
+    """Positions of up to k candidates in MMR order.
+
+    relevance: (n,) scores, higher is better. embeddings: (n, dim)
+    L2-normalized vectors. Candidates whose cosine similarity to an already
+    selected one is at least duplicate_threshold are dropped outright.
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = embeddings @ embeddings.T
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = []
+
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_ * relevance - (1 - lambda_) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        available &= max_similarity < duplicate_threshold
+    return selected
@@ -0,0 +1,126 @@
+"""
+Parallel OCR for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+pytesseract runs one Tesseract subprocess per call, so a thread pool is
+enough to keep OCR_WORKERS pages in flight. Each Tesseract process is
+limited to one OpenMP thread (OMP_THREAD_LIMIT=1, set only in the
+environment pytesseract passes to Tesseract); its own threading only
+fights with the other workers and with embedding. Results come back in
+page order, at most 2 * OCR_WORKERS rendered pages are held in memory, and
+a page that runs past OCR_PAGE_TIMEOUT seconds is killed and skipped.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+from config import Config
+from telemetry import span
+
+class TesseractEnvironment(Mapping):
+    """os.environ as it is at each Tesseract launch, plus OMP_THREAD_LIMIT=1 unless the user set one"""
+
+    def _current(self) -> dict:
+        return {'OMP_THREAD_LIMIT': '1', **os.environ}
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __iter__(self):
+        return iter(self._current())
+
+    def __len__(self):
+        return len(self._current())
+
+def limit_tesseract_threads(pytesseract_module):
+    """Start pytesseract's Tesseract subprocesses with TesseractEnvironment; this process's environment is left alone"""
+    pytesseract_module.pytesseract.environ = TesseractEnvironment()
+
+class OCRPool:
+    """Ordered, bounded fan-out of OCR calls over a thread pool"""
+
+    def __init__(self, workers: int = None, page_timeout: float = None):
+        self.workers = max(1, workers or Config.OCR_WORKERS)
+        self.page_timeout = Config.OCR_PAGE_TIMEOUT if page_timeout is None else page_timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr')
+
+        self._stats_lock = threading.Lock()
+        self.pages = 0
+        self.timeouts = 0
+        self.ocr_seconds = 0.0
+
+    def _run(self, ocr_fn: Callable, label, item) -> str:
+        started = time.perf_counter()
+        try:
+            with span('ocr_page'):
+                return ocr_fn(item, timeout=self.page_timeout)
+        except RuntimeError as e:
+            # pytesseract kills Tesseract and raises RuntimeError on timeout
+            if 'timeout' not in str(e).lower():
+                raise
+            print(f"OCR timed out after {self.page_timeout}s on {label}, skipping")
+            with self._stats_lock:
+                self.timeouts += 1
+            return ""
+        finally:
+            with self._stats_lock:
+                self.pages += 1
+                self.ocr_seconds += time.perf_counter() - started
+
+    def map(self, ocr_fn: Callable, items: Iterable) -> Iterator[str]:
+        """OCR (label, item) pairs with ocr_fn(item, timeout=...), yielding text in input order.
+
+        items may be a generator (e.g. rendering pages); it is consumed only
+        as fast as workers free up.
+        """
+        pending = deque()
+        max_in_flight = self.workers * 2
+        for label, item in items:
+            # Run in a copy of the caller's context so page spans land on its trace
+            context = contextvars.copy_context()
+            pending.append((label, self.executor.submit(context.run, self._run, ocr_fn, label, item)))
+            if len(pending) >= max_in_flight:
+                yield self._result(*pending.popleft())
+        while pending:
+            yield self._result(*pending.popleft())
+
+    def _result(self, label, future) -> str:
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"OCR failed for {label}: {e}")
+            return ""
+
+    def ocr(self, ocr_fn: Callable, item, label: str = "image") -> str:
+        """OCR a single item with the pool's thread limit and timeout"""
+        return next(self.map(ocr_fn, [(label, item)]))
+
+    def metrics(self) -> dict:
+        with self._stats_lock:
+            return {
+                'workers': self.workers,
+                'pages': self.pages,
+                'timeouts': self.timeouts,
+                'ocr_ms_per_page': round(self.ocr_seconds * 1000 / self.pages, 1) if self.pages else 0.0,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_ocr_pool() -> OCRPool:
+    """Process-wide OCR pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OCRPool()
+    return _pool
@@ -0,0 +1,173 @@
+"""
+ONNX Runtime embedding backend for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Runs the configured sentence-transformers model (EMBEDDING_MODEL) through
+ONNX Runtime instead of PyTorch, optionally with dynamic int8 quantization.
+The model is exported once into ONNX_CACHE_DIR (this step needs torch and
+transformers); afterwards only onnxruntime and tokenizers are loaded.
+
+OnnxEmbedder.encode mirrors SentenceTransformer.encode, so it can be used
+anywhere the store uses its model. Mean pooling is applied, matching the
+all-MiniLM / all-mpnet family.
+"""
+
+import inspect
+import os
+from typing import List
+
+import numpy as np
+
+from config import Config
+from lazy_imports import lazy_import
+
+ort = lazy_import('onnxruntime')
+
+def _hub_name(model_name: str) -> str:
+    """Short sentence-transformers names live under the sentence-transformers org"""
+    return model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+
+def model_dir(model_name: str, cache_dir: str = None) -> str:
+    return os.path.join(cache_dir or Config.ONNX_CACHE_DIR, model_name.replace('/', '__'))
+
+def export_onnx(model_name: str, cache_dir: str = None) -> str:
+    """Export the transformer to ONNX (once) and return the model path"""
+    target_dir = model_dir(model_name, cache_dir)
+    onnx_path = os.path.join(target_dir, 'model.onnx')
+    if os.path.exists(onnx_path):
+        return onnx_path
+
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"Exporting {model_name} to ONNX...")
+    os.makedirs(target_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(_hub_name(model_name))
+    model = AutoModel.from_pretrained(_hub_name(model_name))
+    model.eval()
+
+    dummy = tokenizer(["ONNX export sample"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    class _Encoder(torch.nn.Module):
+        """Positional-input wrapper returning only the token embeddings"""
+
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *tensors):
+            return self.transformer(**dict(zip(input_names, tensors))).last_hidden_state
+
+    # Use the TorchScript exporter; newer torch defaults to dynamo, which needs onnxscript
+    export_kwargs = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(model),
+            tuple(dummy[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **export_kwargs
+        )
+    tokenizer.save_pretrained(target_dir)
+    return onnx_path
+
+def quantize_onnx(onnx_path: str) -> str:
+    """Create (once) a dynamically int8-quantized copy of an ONNX model"""
+    quantized_path = onnx_path.replace('.onnx', '.int8.onnx')
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"Quantizing {onnx_path} to int8...")
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encoder running on ONNX Runtime"""
+
+    def __init__(self, model_name: str = 'all-MiniLM-L6-v2', quantize: bool = False,
+                 num_threads: int = None, cache_dir: str = None):
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.quantized = quantize
+        onnx_path = export_onnx(model_name, cache_dir)
+        if quantize:
+            onnx_path = quantize_onnx(onnx_path)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(onnx_path), 'tokenizer.json'))
+        self.tokenizer.enable_truncation(max_length=Config.EMBEDDING_MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = Config.ONNX_THREADS if num_threads is None else num_threads
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(sentences)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        if 'token_type_ids' in self.input_names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real (non-padding) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Encode sentences like SentenceTransformer.encode"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Sort by length so each batch pads to similar lengths, then restore order
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+        batches = [self._encode_batch([sentences[i] for i in order[start:start + batch_size]])
+                   for start in range(0, len(sentences), batch_size)]
+        embeddings = np.empty((len(sentences), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(batches)
+
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+    def token_lengths(self, sentences: List[str]) -> List[int]:
+        """Token count of each sentence after truncation (without padding)"""
+        return [sum(e.attention_mask) for e in self.tokenizer.encode_batch(sentences)]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1])
+
+def compare_embeddings(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Per-sentence cosine agreement of two sets of normalized embeddings"""
+    cosine = (reference * candidate).sum(axis=1)
+    return {
+        'sentences': len(cosine),
+        'min_cosine': round(float(cosine.min()), 5),
+        'mean_cosine': round(float(cosine.mean()), 5),
+        'max_abs_diff': round(float(np.abs(reference - candidate).max()), 5),
+    }
+
+def check_parity(model_name: str, sentences: List[str], quantize: bool = False) -> dict:
+    """Compare ONNX embeddings against the PyTorch SentenceTransformer"""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name).encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+    candidate = OnnxEmbedder(model_name, quantize=quantize).encode(sentences, normalize_embeddings=True)
+    return {'backend': 'onnx-int8' if quantize else 'onnx', **compare_embeddings(reference, candidate)}
@@ -1,50 +1,66 @@
-import fitz  # PyMuPDF
-from typing import List
+from contextlib import contextmanager
+from typing import List, Tuple
 import re
 import io
 import os
+import platform
+import tempfile
+import time
+
+from config import Config
+from lazy_imports import lazy_import, module_available
+from ocr_pool import get_ocr_pool, limit_tesseract_threads
+from telemetry import traced
+
+def _configure_tesseract(pytesseract_module):
+    """Limit Tesseract's threads and locate its binary on Windows (runs once, on first OCR use)"""
+    limit_tesseract_threads(pytesseract_module)
+    if platform.system() != "Windows":
+        return
 
-# Try to import OCR libraries, fallback gracefully if not available
-try:
-    import pytesseract
-    from PIL import Image
-    import cv2
-    import numpy as np
-    OCR_AVAILABLE = True
-    
     # Set tesseract path for Windows (common installation paths)
-    import platform
-    if platform.system() == "Windows":
-        possible_paths = [
-            r"C:\Program Files\Tesseract-OCR\tesseract.exe",
-            r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
-            r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME', '')),
-            r"C:\tools\tesseract\tesseract.exe",
-            "tesseract.exe"  # Try system PATH
-        ]
-        
-        tesseract_found = False
-        for path in possible_paths:
-            try:
-                if path == "tesseract.exe":
-                    # Test if it's in PATH
-                    pytesseract.pytesseract.tesseract_cmd = path
-                    pytesseract.get_tesseract_version()
-                    tesseract_found = True
-                    break
-                elif os.path.exists(path):
-                    pytesseract.pytesseract.tesseract_cmd = path
-                    pytesseract.get_tesseract_version()
-                    tesseract_found = True
-                    print(f"Found Tesseract at: {path}")
-                    break
-            except:
-                continue
-        
-        if not tesseract_found:
-            print("Tesseract installed but not found in common paths")
-except ImportError:
-    OCR_AVAILABLE = False
+    possible_paths = [
+        r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+        r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+        r"C:\Users\{}\AppData\Local\Programs\Tesseract-OCR\tesseract.exe".format(os.getenv('USERNAME', '')),
+        r"C:\tools\tesseract\tesseract.exe",
+        "tesseract.exe"  # Try system PATH
+    ]
+
+    tesseract_found = False
+    for path in possible_paths:
+        try:
+            if path == "tesseract.exe":
+                # Test if it's in PATH
+                pytesseract_module.pytesseract.tesseract_cmd = path
+                pytesseract_module.get_tesseract_version()
+                tesseract_found = True
+                break
+            elif os.path.exists(path):
+                pytesseract_module.pytesseract.tesseract_cmd = path
+                pytesseract_module.get_tesseract_version()
+                tesseract_found = True
+                print(f"Found Tesseract at: {path}")
+                break
+        except:
+            continue
+
+    if not tesseract_found:
+        print("Tesseract installed but not found in common paths")
+
+# PyMuPDF and the OCR stack are imported on first use, not at import time
+fitz = lazy_import('fitz')
+pytesseract = lazy_import('pytesseract', on_load=_configure_tesseract)
+Image = lazy_import('PIL.Image')
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# Word tokens used for chunk offsets and page boundaries
+WORD_PATTERN = re.compile(r'\w+|[\.,!?;\-\n]')
+
+# Check OCR libraries without importing them, fallback gracefully if not available
+OCR_AVAILABLE = all(module_available(name) for name in ('pytesseract', 'PIL', 'cv2', 'numpy'))
+if not OCR_AVAILABLE:
     print("OCR libraries not available. Install pytesseract, Pillow, and opencv-python for image support.")
 
 def check_ocr_setup():
@@ -85,117 +101,318 @@ def get_ocr_install_instructions():
     - Check installation in: `C:\\Program Files\\Tesseract-OCR\\`
     """
 
-def preprocess_image_for_ocr(image):
+def preprocess_image_for_ocr(image, denoise: bool = True):
     """Preprocess image for better OCR results"""
     if not OCR_AVAILABLE:
         return None
         
     try:
-        # Convert PIL image to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        # Convert PIL image to grayscale OpenCV format
+        gray = np.asarray(image.convert('L'))
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply denoising
-        denoised = cv2.fastNlMeansDenoising(gray)
+        # Apply denoising only when the image is noisy; it dominates preprocessing time
+        if denoise:
+            gray = cv2.fastNlMeansDenoising(gray)
         
         # Apply adaptive thresholding
-        thresh = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
         
         return thresh
     except Exception as e:
         print(f"Image preprocessing error: {e}")
         return None
 
+def estimate_noise(image) -> float:
+    """Fast noise sigma estimate (Immerkaer's Laplacian-difference method).
+
+    Text edges are excluded, so clean scans with sharp glyphs score low.
+    """
+    gray = np.asarray(image.convert('L'), dtype=np.float32)
+    height, width = gray.shape
+    if height < 3 or width < 3:
+        return 0.0
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = np.abs(cv2.filter2D(gray, -1, kernel)[1:-1, 1:-1])
+    gradient = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0)) + np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1))
+    flat = gradient[1:-1, 1:-1] < np.percentile(gradient, 90)
+    if not flat.any():
+        return 0.0
+    return float(response[flat].mean() * np.sqrt(np.pi / 2) / 6)
+
+def _uncompressed(image):
+    """Have pytesseract hand Tesseract a raw PGM/PPM instead of compressing a PNG"""
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    # PIL has no 'PGM' writer; its PPM plugin writes grayscale images as PGM (P5)
+    image.format = 'PPM'
+    return image
+
+def _remaining(deadline) -> float:
+    """Seconds left before deadline for the next Tesseract call (0 = no limit)"""
+    if deadline is None:
+        return 0
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise RuntimeError('Tesseract process timeout')
+    return remaining
+
+def ocr_image(image, timeout: float = 0) -> str:
+    """OCR a PIL image, preprocessing only when a cheap quality check asks for it.
+
+    timeout (seconds, 0 = none) bounds the whole page, both passes included;
+    a RuntimeError mentioning the timeout is raised when it is exceeded.
+    """
+    config = '--psm 6'
+    deadline = time.monotonic() + timeout if timeout else None
+    noisy = estimate_noise(image) > Config.OCR_NOISE_THRESHOLD
+
+    if not noisy:
+        # Try simple OCR first
+        try:
+            text = pytesseract.image_to_string(_uncompressed(image), config=config, timeout=_remaining(deadline))
+            if text.strip():
+                return text.strip()
+        except Exception as e:
+            if 'timeout' in str(e).lower():
+                raise
+            print(f"Simple OCR failed: {e}")
+
+    # Noisy image, or simple OCR found nothing: denoise (if noisy) and binarize
+    processed_image = preprocess_image_for_ocr(image, denoise=noisy)
+    if processed_image is not None:
+        text = pytesseract.image_to_string(processed_image, config=config, timeout=_remaining(deadline))
+        return text.strip()
+
+    return ""
+
+@contextmanager
+def _buffer_view(source):
+    """In-memory view of bytes-like or file-like input, without copying where possible.
+
+    The view is released on exit; until then a BytesIO source can't be
+    written to or resized.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+    elif hasattr(source, 'getbuffer'):
+        # BytesIO and Streamlit's UploadedFile expose their buffer directly
+        view = source.getbuffer()
+    else:
+        view = memoryview(source.read())
+    with view:
+        yield view
+
+@contextmanager
+def upload_source(upload, suffix: str = "", spill_threshold: int = None):
+    """Yield an upload in a form the extraction functions accept.
+
+    Uploads up to spill_threshold bytes (UPLOAD_SPILL_THRESHOLD) are passed
+    on as an in-memory buffer. Larger ones are written to a unique temp file
+    for the duration of the block, so concurrent sessions never share a path.
+    """
+    threshold = Config.UPLOAD_SPILL_THRESHOLD if spill_threshold is None else spill_threshold
+    with _buffer_view(upload) as buffer:
+        if buffer.nbytes <= threshold:
+            yield buffer
+            return
+
+        fd, path = tempfile.mkstemp(prefix="rag_upload_", suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(buffer)
+            buffer.release()
+            yield path
+        finally:
+            os.remove(path)
+
+@contextmanager
+def open_pdf(source):
+    """Open a PDF from a path, bytes/memoryview or a file-like object; it is closed on exit"""
+    if isinstance(source, (str, os.PathLike)):
+        doc = fitz.open(source)
+        try:
+            yield doc
+        finally:
+            doc.close()
+        return
+    with _buffer_view(source) as view:
+        # fitz reads from the view without copying, so close the document before releasing it
+        doc = fitz.open(stream=view, filetype="pdf")
+        try:
+            yield doc
+        finally:
+            doc.close()
+
 def extract_text_from_image(image_path_or_bytes):
     """Extract text from image using OCR"""
     if not OCR_AVAILABLE:
         return "OCR not available. Please install Tesseract OCR."
     
     try:
-        if isinstance(image_path_or_bytes, bytes):
-            # If bytes, convert to PIL Image
-            image = Image.open(io.BytesIO(image_path_or_bytes))
-        else:
+        if isinstance(image_path_or_bytes, Image.Image):
+            image = image_path_or_bytes
+        elif isinstance(image_path_or_bytes, (str, os.PathLike)):
             # If file path, open directly
             image = Image.open(image_path_or_bytes)
+        else:
+            # If bytes or a stream, read it from memory
+            with _buffer_view(image_path_or_bytes) as view:
+                image = Image.open(io.BytesIO(view))
         
-        # Try simple OCR first
-        try:
-            text = pytesseract.image_to_string(image, config='--psm 6')
-            if text.strip():
-                return text.strip()
-        except Exception as e:
-            print(f"Simple OCR failed: {e}")
-        
-        # If simple OCR fails, try with preprocessing
-        processed_image = preprocess_image_for_ocr(image)
-        if processed_image is not None:
-            text = pytesseract.image_to_string(processed_image, config='--psm 6')
-            return text.strip()
-        
-        return ""
+        # Runs on the OCR pool for its Tesseract thread limit and timeout
+        return get_ocr_pool().ocr(ocr_image, image)
     except Exception as e:
         print(f"OCR Error: {e}")
         return f"OCR Error: {str(e)}"
 
-def extract_text_from_pdf(pdf_path: str, use_ocr: bool = True) -> str:
-    """Extract text from PDF, including OCR for images when available"""
-    doc = fitz.open(pdf_path)
-    text = ""
+def choose_ocr_zoom(page) -> float:
+    """Render zoom for OCR from page size and the resolution of its images.
+
+    Aims for OCR_TARGET_DPI, but never renders embedded scans above their
+    native resolution (upsampling adds pixels, not detail) and keeps the
+    longest side within OCR_MAX_DIMENSION pixels.
+    """
+    zoom = Config.OCR_TARGET_DPI / 72
+    native_zooms = []
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info['bbox'])
+        if bbox.width > 0 and info.get('width'):
+            native_zooms.append(info['width'] / bbox.width)
+    if native_zooms:
+        zoom = min(zoom, max(max(native_zooms), 1.0))
+
+    longest_side = max(page.rect.width, page.rect.height)
+    return min(zoom, Config.OCR_MAX_DIMENSION / longest_side) if longest_side else zoom
+
+def _full_page_image(doc, page):
+    """The page's embedded scan, if the page is a single upright image covering it.
+
+    The image is scaled down to the zoom render_page_for_ocr would use, so
+    OCR_TARGET_DPI and OCR_MAX_DIMENSION apply to both paths.
+    """
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    xref, smask = images[0][0], images[0][1]
+    if smask or page.rotation:
+        return None
+
+    # Rotated or flipped placements would reach Tesseract sideways or mirrored
+    placements = [info for info in page.get_image_info(xrefs=True) if info.get('xref') == xref]
+    if len(placements) != 1:
+        return None
+    a, b, c, d = placements[0]['transform'][:4]
+    if abs(b) > 1e-6 or abs(c) > 1e-6 or a <= 0 or d <= 0:
+        return None
+
+    page_area = abs(page.rect)
+    bbox = fitz.Rect(placements[0]['bbox']) & page.rect
+    if not page_area or abs(bbox) / page_area < 0.9:
+        return None
+
+    # Decode the embedded image straight to grayscale samples; extract_image
+    # would re-encode non-JPEG images as PNG
+    try:
+        pix = fitz.Pixmap(doc, xref)
+        if pix.colorspace is None or pix.colorspace.n != 1 or pix.alpha:
+            pix = fitz.Pixmap(fitz.csGRAY, pix, 0)
+    except Exception:
+        # Stencil masks and other unusual images are rendered instead
+        return None
+    image = Image.frombytes('L', (pix.width, pix.height), pix.samples)
+
+    zoom = choose_ocr_zoom(page)
+    size = (max(1, round(a * zoom)), max(1, round(d * zoom)))
+    if size[0] < image.width or size[1] < image.height:
+        image = image.resize(size, Image.Resampling.BOX)
+    return image
+
+def render_page_for_ocr(doc, page):
+    """PIL image of a page for OCR, without a PNG encode/decode round-trip"""
+    image = _full_page_image(doc, page)
+    if image is not None:
+        return image
+
+    zoom = choose_ocr_zoom(page)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return Image.frombytes('L', (pix.width, pix.height), pix.samples)
+
+@traced('extraction')
+def extract_pages_from_pdf(pdf_source, use_ocr: bool = True) -> List[str]:
+    """Extract the text of each page of a PDF (path, bytes or stream), OCRing image pages when available"""
     ocr_pages_used = []
-    
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
+    with open_pdf(pdf_source) as doc:
         # First, try to extract text normally
-        page_text = page.get_text()
-        
+        page_texts = [doc[page_num].get_text() for page_num in range(len(doc))]
+    
         # If no text found or very little text, try OCR on the page image
-        if use_ocr and OCR_AVAILABLE and (not page_text.strip() or len(page_text.strip()) < 50):
-            try:
-                # Render page as image
-                mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better OCR
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-                
-                # Extract text using OCR
-                ocr_text = extract_text_from_image(img_data)
-                
-                if ocr_text.strip() and not ocr_text.startswith("OCR Error"):
-                    page_text = ocr_text
+        ocr_pages = [page_num for page_num, page_text in enumerate(page_texts)
+                     if use_ocr and OCR_AVAILABLE and (not page_text.strip() or len(page_text.strip()) < 50)]
+    
+        def rendered_pages():
+            # Pages are rendered here as the pool frees up, so few are held at once
+            for page_num in ocr_pages:
+                try:
+                    # Render page (or take its embedded scan) as a grayscale image
+                    image = render_page_for_ocr(doc, doc[page_num])
+                except Exception as e:
+                    print(f"OCR failed for page {page_num + 1}: {e}")
+                    image = None
+                yield f"page {page_num + 1}", image
+    
+        def ocr_page(image, timeout: float = 0) -> str:
+            return ocr_image(image, timeout=timeout) if image is not None else ""
+    
+        if ocr_pages:
+            # Extract text using OCR, in parallel and in page order
+            for page_num, ocr_text in zip(ocr_pages, get_ocr_pool().map(ocr_page, rendered_pages())):
+                if ocr_text.strip():
+                    page_texts[page_num] = ocr_text
                     ocr_pages_used.append(page_num + 1)
                     print(f"Used OCR for page {page_num + 1}")
-                
-            except Exception as e:
-                print(f"OCR failed for page {page_num + 1}: {e}")
-        
-        text += page_text + "\n"
-    
-    doc.close()
     
     if ocr_pages_used:
         print(f"OCR was used for pages: {ocr_pages_used}")
     
-    return text
+    return page_texts
+
+def join_pages(page_texts: List[str]) -> str:
+    return "".join(page_text + "\n" for page_text in page_texts)
+
+def extract_text_from_pdf(pdf_source, use_ocr: bool = True) -> str:
+    """Extract text from PDF (path, bytes or stream), including OCR for images when available"""
+    return join_pages(extract_pages_from_pdf(pdf_source, use_ocr))
+
+def page_word_starts(page_texts: List[str]) -> List[int]:
+    """Word position (as counted by chunk_text_with_offsets on join_pages) where each page begins"""
+    starts, position = [], 0
+    for page_text in page_texts:
+        starts.append(position)
+        position += len(WORD_PATTERN.findall(page_text + "\n"))
+    return starts
 
-def extract_text_from_image_file(image_path: str) -> str:
-    """Extract text from standalone image file"""
+@traced('extraction')
+def extract_text_from_image_file(image_path) -> str:
+    """Extract text from standalone image file (path, bytes or stream)"""
     if not OCR_AVAILABLE:
         return "OCR not available. Please install Tesseract OCR to extract text from images."
     
     return extract_text_from_image(image_path)
 
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """Split text into chunks with overlap"""
+@traced('chunking')
+def chunk_text_with_offsets(text: str, chunk_size: int = 500, overlap: int = 50) -> List[Tuple[str, int, int]]:
+    """Split text into overlapping chunks, returning (chunk, start_word, end_word)"""
     # Split text into words
-    words = re.findall(r'\w+|[\.,!?;\-\n]', text)
+    words = WORD_PATTERN.findall(text)
     chunks = []
     start = 0
     while start < len(words):
         end = min(start + chunk_size, len(words))
         chunk = ' '.join(words[start:end])
-        chunks.append(chunk)
+        chunks.append((chunk, start, end))
         start += chunk_size - overlap
-    return chunks 
\ No newline at end of file
+    return chunks
+
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    """Split text into chunks with overlap"""
+    return [chunk for chunk, start, end in chunk_text_with_offsets(text, chunk_size, overlap)]
@@ -0,0 +1,189 @@
+"""
+Profiling mode for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+With PROFILING=true, each ingest and question runs under cProfile and
+tracemalloc. Every run writes three files to PROFILE_DIR:
+    <stamp>_<name>.prof        cProfile stats (open with pstats or snakeviz)
+    <stamp>_<name>.txt         top functions by cumulative and own time
+    <stamp>_<name>_alloc.txt   top allocation sites and peak traced memory
+
+cProfile sees only the thread that started the run. OCR threads, embedding
+pool processes and the Tesseract subprocesses show up as time spent waiting
+on them. tracemalloc slows Python-heavy code (notably the first model load)
+several times over; set PROFILE_TRACEMALLOC=false for timing-only runs.
+
+Usage:
+    python profiling.py list
+    python profiling.py diff profiles/old_ingest.prof profiles/new_ingest.prof
+    python profiling.py diff old.prof new.prof --filter pdf_utils vector_store --fail-over 20
+"""
+
+import argparse
+import cProfile
+import glob
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from config import Config
+
+# cProfile allows one active profiler per process; concurrent runs are skipped
+_profile_lock = threading.Lock()
+
+class ProfileRun:
+    """Output paths of one profiled run"""
+
+    def __init__(self, name: str):
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f"-{int(time.time() * 1000) % 1000:03d}"
+        base = os.path.join(Config.PROFILE_DIR, f"{stamp}_{name}")
+        self.name = name
+        self.stats_path = f"{base}.prof"
+        self.report_path = f"{base}.txt"
+        self.alloc_path = f"{base}_alloc.txt"
+        self.seconds = 0.0
+        self.peak_bytes = 0
+
+def _write_report(profiler: cProfile.Profile, run: ProfileRun):
+    profiler.dump_stats(run.stats_path)
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write(f"{run.name}: {run.seconds:.3f}s wall\n\n== by cumulative time ==\n")
+    stats.sort_stats('cumulative').print_stats(Config.PROFILE_TOP_N)
+    out.write("\n== by own time ==\n")
+    stats.sort_stats('tottime').print_stats(Config.PROFILE_TOP_N)
+    with open(run.report_path, 'w') as f:
+        f.write(out.getvalue())
+
+def _write_allocations(snapshot: tracemalloc.Snapshot, run: ProfileRun):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ])
+    with open(run.alloc_path, 'w') as f:
+        f.write(f"{run.name}: peak traced memory {run.peak_bytes / 1e6:.1f} MB\n\n")
+        for stat in snapshot.statistics('lineno')[:Config.PROFILE_TOP_N]:
+            frame = stat.traceback[0]
+            f.write(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}\n")
+
+@contextmanager
+def profile_run(name: str):
+    """Profile the enclosed block when profiling mode is on; yields a ProfileRun or None"""
+    if not Config.PROFILING_ENABLED or not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+
+    run = ProfileRun(name)
+    started_tracing = False
+    try:
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        if Config.PROFILE_TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start(Config.PROFILE_TRACEMALLOC_FRAMES)
+            started_tracing = True
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield run
+        finally:
+            profiler.disable()
+            run.seconds = time.perf_counter() - started
+            try:
+                _write_report(profiler, run)
+                if started_tracing:
+                    run.peak_bytes = tracemalloc.get_traced_memory()[1]
+                    _write_allocations(tracemalloc.take_snapshot(), run)
+                print(f"Profile written: {run.report_path}")
+            except OSError as e:
+                print(f"Could not write profile for {name}: {e}")
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+def _function_label(key: Tuple[str, int, str]) -> str:
+    # No line number, so functions still match after code above them moves
+    filename, line, function = key
+    return f"{os.path.basename(filename)}:{function}" if line else function
+
+def load_profile(path: str) -> Dict[str, Tuple[int, float, float]]:
+    """function label -> (calls, own seconds, cumulative seconds)"""
+    totals: Dict[str, Tuple[int, float, float]] = {}
+    for key, (primitive_calls, calls, own, cumulative, callers) in pstats.Stats(path).stats.items():
+        label = _function_label(key)
+        previous_calls, previous_own, previous_cumulative = totals.get(label, (0, 0.0, 0.0))
+        totals[label] = (previous_calls + calls, previous_own + own, previous_cumulative + cumulative)
+    return totals
+
+def diff_profiles(old_path: str, new_path: str, filters: List[str] = None) -> List[dict]:
+    """Per-function change in own/cumulative time, largest cumulative regression first"""
+    old, new = load_profile(old_path), load_profile(new_path)
+    rows = []
+    for label in set(old) | set(new):
+        if filters and not any(pattern in label for pattern in filters):
+            continue
+        old_calls, old_own, old_cumulative = old.get(label, (0, 0.0, 0.0))
+        new_calls, new_own, new_cumulative = new.get(label, (0, 0.0, 0.0))
+        rows.append({
+            'function': label,
+            'calls': (old_calls, new_calls),
+            'own_delta': new_own - old_own,
+            'cumulative': (old_cumulative, new_cumulative),
+            'cumulative_delta': new_cumulative - old_cumulative,
+            'change_pct': (new_cumulative - old_cumulative) / old_cumulative * 100 if old_cumulative else None,
+        })
+    rows.sort(key=lambda row: row['cumulative_delta'], reverse=True)
+    return rows
+
+def _print_diff(rows: List[dict], top: int):
+    print(f"{'function':<60}{'calls':>16}{'cum old s':>11}{'cum new s':>11}{'delta s':>10}{'change':>9}")
+    shown = rows[:top] + [row for row in rows[-top:] if row not in rows[:top] and row['cumulative_delta'] < 0]
+    for row in shown:
+        calls = f"{row['calls'][0]}->{row['calls'][1]}"
+        change = f"{row['change_pct']:+.0f}%" if row['change_pct'] is not None else "new"
+        print(f"{row['function'][:59]:<60}{calls:>16}{row['cumulative'][0]:>11.4f}"
+              f"{row['cumulative'][1]:>11.4f}{row['cumulative_delta']:>+10.4f}{change:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compare RAG Assistant profiles")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help="List profiles in PROFILE_DIR")
+
+    diff = subparsers.add_parser('diff', help="Compare two .prof files")
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--top', type=int, default=20)
+    diff.add_argument('--filter', nargs='+', help="Only functions whose file:function label contains one of these")
+    diff.add_argument('--fail-over', type=float, metavar='PCT',
+                      help="Exit 1 if any shown function's cumulative time grew by more than PCT percent")
+    diff.add_argument('--min-seconds', type=float, default=0.001,
+                      help="Ignore regressions smaller than this when failing")
+
+    args = parser.parse_args()
+    if args.command == 'list':
+        for path in sorted(glob.glob(os.path.join(Config.PROFILE_DIR, '*.prof'))):
+            print(path)
+        return
+
+    rows = diff_profiles(args.old, args.new, args.filter)
+    _print_diff(rows, args.top)
+
+    if args.fail_over is not None:
+        regressions = [row for row in rows
+                       if row['change_pct'] is not None and row['change_pct'] > args.fail_over
+                       and row['cumulative_delta'] >= args.min_seconds]
+        if regressions:
+            print(f"\n{len(regressions)} function(s) regressed by more than {args.fail_over:.0f}%")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
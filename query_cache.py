@@ -0,0 +1,69 @@
+"""
+Query caches for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Suggestion buttons and repeated questions send the same query text again
+and again. EnhancedVectorStore keeps two LRU caches: normalized query ->
+embedding, which skips the transformer, and (index version, query, search
+options) -> ranked chunk IDs, which skips the search as well. The second is
+dropped whenever the index changes.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISSING = object()
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: surrounding and repeated whitespace removed"""
+    return re.sub(r'\s+', ' ', query).strip()
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with hit/miss counters"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._items.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,115 @@
+"""
+Structured question requests for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+A RAGRequest carries the question, retrieved chunks, chat history and
+document metadata from the UI to the LLM backends. The prompt is rendered
+once, by the backend that actually calls a model, so fallbacks and
+temperature selection never have to parse it back out of a string.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from context_packer import pack_prompt_inputs
+from telemetry import traced
+
+# Questions asking for explanations get a higher temperature
+EXPLANATORY_WORDS = ['explain', 'describe', 'how', 'why', 'what']
+
+@dataclass
+class RAGRequest:
+    """Everything needed to answer one question about a document"""
+    question: str
+    chunks: list = field(default_factory=list)  # Chunk strings or enhanced_search results
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    metadata: Optional[dict] = None
+    temperature: Optional[float] = None  # None selects it from the question type
+    raw_prompt: Optional[str] = None  # Pre-rendered prompt from legacy callers
+
+    @property
+    def chunk_texts(self) -> List[str]:
+        """Retrieved chunk texts without scores or metadata"""
+        return [chunk if isinstance(chunk, str) else chunk[0] for chunk in self.chunks]
+
+    def choose_temperature(self) -> float:
+        """Lower temperature for factual questions, higher for explanations"""
+        if self.temperature is not None:
+            return self.temperature
+        question_lower = self.question.lower()
+        if any(word in question_lower for word in EXPLANATORY_WORDS):
+            return 0.7
+        return 0.3
+
+class PromptSections:
+    """Prompt split into a cacheable prefix and the per-turn suffix.
+
+    system holds the fixed instructions and document info (identical every
+    turn), history the previous conversation and turn the retrieved context
+    and current question. Sections are ordered so that the prefix stays
+    byte-identical across turns and the backend can reuse its KV cache.
+    """
+
+    def __init__(self, system, history, turn):
+        self.system = system
+        self.history = history
+        self.turn = turn
+
+    @property
+    def full(self):
+        return self.system + self.history + self.turn
+
+    def __str__(self):
+        return self.full
+
+@traced('prompt_build')
+def render_prompt(request: RAGRequest, model_name: Optional[str] = None) -> PromptSections:
+    """Render a request into prompt sections fitted to the model's token budget.
+
+    Overlapping chunks are merged and context and history are packed by
+    tokens (see context_packer).
+    """
+    if request.raw_prompt is not None:
+        return PromptSections("", "", request.raw_prompt)
+
+    # Add document metadata if available
+    metadata_context = ""
+    if request.metadata:
+        metadata_context = f"DOCUMENT INFO: {request.metadata}\n\n"
+
+    # Static prefix: identical for every question about the same document
+    system = f"""You are an expert document analyst and question-answering assistant. Your job is to provide accurate, detailed, and helpful answers based on the provided document context.
+
+INSTRUCTIONS:
+1. Use ONLY the information provided in the document context
+2. If the context doesn't contain enough information, clearly state what's missing
+3. Provide specific details and examples when available
+4. If this is a follow-up question, consider the previous conversation
+5. Structure your answer clearly with bullet points or numbered lists when appropriate
+6. Quote specific parts of the document when relevant
+
+{metadata_context}"""
+
+    def render_turn(context):
+        return f"""DOCUMENT CONTEXT:
+{context}
+
+CURRENT QUESTION: {request.question}
+
+ANSWER: Provide a comprehensive, accurate answer based on the document context above. If you need to make any assumptions or if information is unclear, explicitly state this."""
+
+    # Fit context and history into what the template leaves of the window
+    passages, history = pack_prompt_inputs(
+        request.chunks, request.history, system + "Previous conversation:\n" + render_turn(""), model_name
+    )
+
+    # Build chat history context (append-only, so it extends the cached prefix)
+    history_context = ""
+    if history:
+        history_context = "Previous conversation:\n"
+        for i, (q, a) in enumerate(history):
+            history_context += f"Q{i+1}: {q}\nA{i+1}: {a}\n"
+        history_context += "\n"
+
+    return PromptSections(system, history_context, render_turn('\n\n'.join(passages)))
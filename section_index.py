@@ -0,0 +1,85 @@
+"""
+Section-level index for hierarchical retrieval in Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+Consecutive chunks are grouped into sections of about SECTION_SIZE chunks,
+closed at page boundaries where page numbers are known. Each section's
+vector is the mean of its chunk embeddings, re-normalized. A query first
+picks the SECTION_TOP_K best sections from this small index; the chunk
+search then only scores chunks of those sections, through the same
+IDSelectorBitmap used for metadata filters.
+
+Section vectors are saved next to the chunk index, so a memory-mapped
+index never has to be read in full to rebuild them.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from search_filter import search_params
+
+faiss = lazy_import('faiss')
+
+class SectionIndex:
+    """Mean-pooled section vectors and the section of every chunk"""
+
+    def __init__(self, chunk_sections: np.ndarray, vectors: np.ndarray):
+        self.chunk_sections = np.asarray(chunk_sections, dtype=np.int64)
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.index = faiss.IndexFlatIP(self.vectors.shape[1])
+        self.index.add(self.vectors)
+
+    @property
+    def num_sections(self) -> int:
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, chunk_metadata: List[dict], section_size: int) -> 'SectionIndex':
+        chunk_sections = np.empty(len(embeddings), dtype=np.int64)
+        section, size, page = 0, 0, None
+        for chunk_id in range(len(embeddings)):
+            chunk_page = chunk_metadata[chunk_id].get('page_start') if chunk_id < len(chunk_metadata) else None
+            # Close a full section, at a page boundary when pages are known
+            if size >= section_size and (chunk_page is None or chunk_page != page or size >= 2 * section_size):
+                section, size = section + 1, 0
+            chunk_sections[chunk_id] = section
+            size, page = size + 1, chunk_page
+
+        num_sections = section + 1 if len(embeddings) else 0
+        vectors = np.zeros((num_sections, embeddings.shape[1]), dtype=np.float32)
+        np.add.at(vectors, chunk_sections, embeddings)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(chunk_sections, vectors)
+
+    def chunk_mask(self, query_emb: np.ndarray, top_sections: int, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask over chunks in the top_sections sections closest to the query.
+
+        allowed (a chunk mask, e.g. from a search filter) limits both the
+        sections considered and the chunks returned.
+        """
+        params = None
+        if allowed is not None:
+            allowed_sections = np.zeros(self.num_sections, dtype=bool)
+            allowed_sections[self.chunk_sections[allowed]] = True
+            top_sections = min(top_sections, int(allowed_sections.sum()))
+            params = search_params(allowed_sections)
+        if top_sections <= 0:
+            return np.zeros(len(self.chunk_sections), dtype=bool)
+        if params is not None:
+            _, sections = self.index.search(query_emb, top_sections, params=params)
+        else:
+            _, sections = self.index.search(query_emb, top_sections)
+        mask = np.isin(self.chunk_sections, sections[0][sections[0] >= 0])
+        return mask & allowed if allowed is not None else mask
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            np.savez(f, chunk_sections=self.chunk_sections, vectors=self.vectors)
+
+    @classmethod
+    def load(cls, path: str) -> 'SectionIndex':
+        with np.load(path) as data:
+            return cls(data['chunk_sections'], data['vectors'])
@@ -0,0 +1,203 @@
+"""
+Sharded FAISS index for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+ShardedIndex spreads chunk vectors over N IndexIDMap2(IndexFlatIP) shards.
+Chunks are assigned by hashing their ID. Every shard keeps the global chunk IDs, so
+search fans a query out to all shards on a thread pool (FAISS releases the
+GIL while searching) and heap-merges the per-shard hits into the global
+top-k. Results have the same shape as faiss.Index.search, so the store's
+re-ranking is unchanged.
+
+Shards are saved as separate files in one directory, with a manifest, and
+can be loaded individually. That lets several processes on one box each
+serve part of a corpus too large for one index.
+"""
+
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from config import Config
+from lazy_imports import lazy_import
+
+faiss = lazy_import('faiss')
+
+MANIFEST_NAME = 'manifest.json'
+
+def read_index(path: str, mmap: bool = False):
+    """Read a FAISS index, memory-mapped and read-only where the index type allows.
+
+    IO_FLAG_MMAP_IFC maps the codes of flat indexes (also inside IndexIDMap2)
+    without copying them; IO_FLAG_MMAP maps IVF inverted lists. Plain
+    IO_FLAG_MMAP alone still copies flat codes onto the heap.
+    """
+    if mmap:
+        flat_codes = getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)  # faiss >= 1.9
+        for flags in (flat_codes | faiss.IO_FLAG_MMAP, faiss.IO_FLAG_MMAP):
+            if not flags:
+                continue
+            try:
+                return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                continue
+        print(f"Memory-mapped load not supported for {path}, reading index")
+    return faiss.read_index(path)
+
+def write_index(index, path: str):
+    """Write a FAISS index through a temp file and rename it into place.
+
+    Other processes may have the old file memory-mapped (read_index with
+    mmap=True); truncating it under them would crash their next search.
+    The rename leaves their mapping on the old inode.
+    """
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        faiss.write_index(index, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def index_files(path: str) -> List[str]:
+    """Files backing a saved index: the index file, or the shard files of a sharded one"""
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.index'))
+    return [path] if os.path.isfile(path) else []
+
+def _hash_shard(ids: np.ndarray, num_shards: int) -> np.ndarray:
+    # Multiplicative hash so consecutive IDs (one document's chunks) still spread evenly
+    return ((ids.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32) % np.uint64(num_shards)).astype(np.int64)
+
+class ShardedIndex:
+    """N flat inner-product shards searched in parallel, with a FAISS-like interface"""
+
+    def __init__(self, dim: int, num_shards: int = 2, shards: List = None, shard_ids: List[int] = None):
+        self.d = dim
+        self.num_shards = num_shards
+        # shard_ids: which of the num_shards this instance holds (all unless loaded partially)
+        self.shard_ids = list(shard_ids) if shard_ids is not None else list(range(num_shards))
+        self.shards = shards if shards is not None else [
+            faiss.IndexIDMap2(faiss.IndexFlatIP(dim)) for _ in self.shard_ids
+        ]
+        threads = Config.INDEX_SEARCH_THREADS or len(self.shards)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='shard-search')
+        self._closed = False
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    def assign(self, ids: np.ndarray) -> np.ndarray:
+        """Shard number of each chunk ID"""
+        return _hash_shard(ids, self.num_shards)
+
+    def add_with_ids(self, embeddings: np.ndarray, ids: np.ndarray):
+        """Add vectors under their global chunk IDs"""
+        ids = np.asarray(ids, dtype=np.int64)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        assignment = self.assign(ids)
+        for position, shard_id in enumerate(self.shard_ids):
+            mask = assignment == shard_id
+            if mask.any():
+                self.shards[position].add_with_ids(embeddings[mask], ids[mask])
+
+    def add(self, embeddings: np.ndarray):
+        start = self.ntotal
+        self.add_with_ids(embeddings, np.arange(start, start + len(embeddings)))
+
+    def reconstruct(self, chunk_id: int) -> np.ndarray:
+        shard_id = int(self.assign(np.array([chunk_id]))[0])
+        if shard_id in self.shard_ids:
+            try:
+                return self.shards[self.shard_ids.index(shard_id)].reconstruct(int(chunk_id))
+            except RuntimeError:
+                pass
+        raise KeyError(chunk_id)
+
+    def reconstruct_batch(self, chunk_ids) -> np.ndarray:
+        """Stored vectors of several chunks, fetched shard by shard"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        vectors = np.empty((len(chunk_ids), self.d), dtype=np.float32)
+        assignment = self.assign(chunk_ids)
+        found = np.zeros(len(chunk_ids), dtype=bool)
+        for position, shard_id in enumerate(self.shard_ids):
+            mask = assignment == shard_id
+            if mask.any():
+                vectors[mask] = self.shards[position].reconstruct_batch(chunk_ids[mask])
+                found |= mask
+        if not found.all():
+            raise KeyError(int(chunk_ids[~found][0]))
+        return vectors
+
+    def search(self, queries: np.ndarray, k: int, params=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Global top-k over all shards: (scores, ids), padded with -1 like faiss"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+        def search_shard(shard):
+            if shard.ntotal == 0:
+                return None
+            return shard.search(queries, min(k, shard.ntotal), params=params) if params is not None \
+                else shard.search(queries, min(k, shard.ntotal))
+
+        futures = None
+        if len(self.shards) > 1 and not self._closed:
+            try:
+                futures = [self._executor.submit(search_shard, shard) for shard in self.shards]
+            except RuntimeError:
+                # Closed by a concurrent swap; finish this query on the calling thread
+                futures = None
+        if futures is not None:
+            per_shard = [future.result() for future in futures]
+        else:
+            per_shard = [search_shard(shard) for shard in self.shards]
+        per_shard = [result for result in per_shard if result is not None]
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            # Each shard's hits are already sorted; merge them and keep the best k
+            merged = heapq.merge(*[zip(D[row], I[row]) for D, I in per_shard], key=lambda hit: -hit[0])
+            top = [(score, chunk_id) for score, chunk_id in merged if chunk_id >= 0][:k]
+            if top:
+                scores[row, :len(top)], ids[row, :len(top)] = zip(*top)
+        return scores, ids
+
+    def close(self):
+        """Stop the search threads once the index is swapped out; later searches run shard by shard"""
+        self._closed = True
+        self._executor.shutdown(wait=False)
+
+    def save(self, directory: str):
+        """Write each shard to its own file, then the manifest"""
+        os.makedirs(directory, exist_ok=True)
+        for shard_id, shard in zip(self.shard_ids, self.shards):
+            write_index(shard, os.path.join(directory, f"shard_{shard_id:03d}.index"))
+        manifest = {
+            'dim': self.d,
+            'num_shards': self.num_shards,
+            'shard_sizes': {str(shard_id): shard.ntotal for shard_id, shard in zip(self.shard_ids, self.shards)},
+        }
+        temp_path = os.path.join(directory, MANIFEST_NAME + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+
+    @classmethod
+    def load(cls, directory: str, shard_ids: List[int] = None, mmap: bool = False) -> 'ShardedIndex':
+        """Load all shards, or only shard_ids (e.g. this process's share)"""
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        shard_ids = list(range(manifest['num_shards'])) if shard_ids is None else list(shard_ids)
+        shards = [read_index(os.path.join(directory, f"shard_{shard_id:03d}.index"), mmap=mmap)
+                  for shard_id in shard_ids]
+        return cls(manifest['dim'], manifest['num_shards'], shards=shards, shard_ids=shard_ids)
+
+def is_sharded(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
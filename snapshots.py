@@ -0,0 +1,160 @@
+"""
+Atomic, versioned index snapshots for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+A snapshot is a directory holding the FAISS index, chunks.pkl,
+chunk_metadata.pkl and a manifest.json with per-file SHA-256 checksums,
+sizes, chunk count and the embedding model name. It is written under a
+temporary name, fsynced, and renamed into place. The CURRENT pointer file
+is then replaced atomically, so readers see either the old snapshot or the
+new one, never a mix. A crash mid-save leaves only a stray .tmp-* directory.
+
+Layout:
+    SNAPSHOT_DIR/
+        CURRENT                 name of the live snapshot
+        v20250101-120000.123456-a1b2/  faiss.index  chunks.pkl  chunk_metadata.pkl  manifest.json
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+FORMAT_VERSION = 1
+
+class SnapshotError(RuntimeError):
+    """A snapshot is missing, incomplete or does not match its manifest"""
+
+def _fsync_path(path: str):
+    """Flush a file or directory to disk (directories only where the OS allows it)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _snapshot_files(directory: str) -> List[str]:
+    """Relative paths of the data files in a snapshot (shard directories included)"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            relative = os.path.relpath(os.path.join(root, name), directory)
+            if relative != MANIFEST_NAME:
+                files.append(relative.replace(os.sep, '/'))
+    return sorted(files)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_snapshot(root: str, write_files: Callable[[str], None], manifest: Dict = None) -> str:
+    """Write a new snapshot and make it current; returns its version name.
+
+    write_files(directory) writes the data files into a fresh temporary
+    directory. Checksums and the manifest are added here.
+    """
+    os.makedirs(root, exist_ok=True)
+    # Sortable by creation time; the suffix keeps concurrent writers apart
+    now = time.time()
+    version = f"v{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1e6) % 10**6:06d}-{uuid.uuid4().hex[:4]}"
+    temp_dir = os.path.join(root, f".tmp-{version}")
+    os.makedirs(temp_dir)
+    try:
+        write_files(temp_dir)
+
+        files = {}
+        for relative in _snapshot_files(temp_dir):
+            path = os.path.join(temp_dir, relative)
+            _fsync_path(path)
+            files[relative] = {'sha256': file_sha256(path), 'bytes': os.path.getsize(path)}
+
+        with open(os.path.join(temp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump({'format': FORMAT_VERSION, 'version': version, 'created_at': time.time(),
+                       **(manifest or {}), 'files': files}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_path(temp_dir)
+
+        final_dir = os.path.join(root, version)
+        os.rename(temp_dir, final_dir)
+        _fsync_path(root)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    _set_current(root, version)
+    prune_snapshots(root)
+    return version
+
+def _set_current(root: str, version: str):
+    temp_path = os.path.join(root, f"{CURRENT_NAME}.tmp-{uuid.uuid4().hex[:6]}")
+    with open(temp_path, 'w') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, os.path.join(root, CURRENT_NAME))
+    _fsync_path(root)
+
+def current_version(root: str) -> Optional[str]:
+    """Name of the live snapshot, or None if nothing has been saved"""
+    try:
+        with open(os.path.join(root, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def read_manifest(root: str, version: str) -> dict:
+    try:
+        with open(os.path.join(root, version, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Snapshot {version} has no readable manifest: {e}")
+
+def verify_snapshot(root: str, version: str, checksums: bool = False) -> dict:
+    """Check that every file in the manifest exists with the recorded size (and checksum)"""
+    manifest = read_manifest(root, version)
+    directory = os.path.join(root, version)
+    for relative, expected in manifest['files'].items():
+        path = os.path.join(directory, relative)
+        if not os.path.isfile(path) or os.path.getsize(path) != expected['bytes']:
+            raise SnapshotError(f"Snapshot {version}: {relative} is missing or truncated")
+        if checksums and file_sha256(path) != expected['sha256']:
+            raise SnapshotError(f"Snapshot {version}: checksum mismatch for {relative}")
+    return manifest
+
+def list_snapshots(root: str) -> List[str]:
+    """Complete snapshot versions, oldest first"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if name.startswith('v') and os.path.isfile(os.path.join(root, name, MANIFEST_NAME)))
+
+def prune_snapshots(root: str, keep: int = None):
+    """Remove all but the newest `keep` snapshots (never the current one) and stale temp dirs"""
+    keep = Config.SNAPSHOT_KEEP if keep is None else keep
+    current = current_version(root)
+    for version in list_snapshots(root)[:-keep] if keep > 0 else []:
+        if version != current:
+            # Readers still holding an old (mmapped) snapshot keep working on POSIX
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    cutoff = time.time() - 3600
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('.tmp-') and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
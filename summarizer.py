@@ -0,0 +1,215 @@
+"""
+Map-reduce answers for whole-document questions in Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+"Summarize this document" can't be answered from the top search_k chunks.
+For such questions the whole document is read instead:
+  map     the chunks, de-overlapped and in document order, are packed into
+          groups that fit the model's context and summarized in parallel
+  reduce  partial summaries are combined group by group, level by level,
+          until they fit in one prompt
+  answer  the question is answered from the combined summary
+
+Map and reduce outputs are cached in SQLite (SUMMARY_CACHE_DB) by document
+and prompt, so later whole-document questions on the same document only pay
+for the final answer.
+"""
+
+import contextvars
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from config import Config
+from context_packer import estimate_tokens, truncate_to_tokens
+from telemetry import span
+from vector_store import document_fingerprint
+
+_DOCUMENT = r"(this|the|entire|whole)\s+(whole\s+|entire\s+)?(document|file|report|pdf|paper|text)"
+_MAIN_POINTS = r"(the\s+)?(main|key)\s+(points|ideas|topics|takeaways|findings)"
+
+# Only phrasings about the document as a whole: "summary judgment amount" or
+# "overview of clause 4" are ordinary retrieval questions
+WHOLE_DOCUMENT_PATTERN = re.compile(
+    r"^\s*(please\s+)?(summari[sz]e|tl;?dr)(\s+(it|this|everything|" + _MAIN_POINTS + "|" + _DOCUMENT + r"))?\s*[.?!]*\s*$"
+    r"|^\s*what\s+are\s+" + _MAIN_POINTS + r"(\s+of\s+" + _DOCUMENT + r")?\s*[.?!]*\s*$"
+    r"|\bsummari[sz]e\s+" + _DOCUMENT + r"\b"
+    r"|\b(summary|overview|gist|" + _MAIN_POINTS + r")\s+(of|in|for)\s+" + _DOCUMENT + r"\b"
+    r"|\bwhat('s|\s+is)\s+" + _DOCUMENT + r"\s+about\b",
+    re.IGNORECASE)
+
+MAP_PROMPT = """Summarize the following part of a document in 3-6 sentences. Keep important names, numbers, dates and amounts.
+
+DOCUMENT PART:
+{text}
+
+SUMMARY:"""
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of one document. Combine them into a single summary that keeps the most important facts, names, numbers and dates.
+
+{text}
+
+COMBINED SUMMARY:"""
+
+ANSWER_PROMPT = """Below is a summary of an entire document, built from summaries of all of its parts.
+
+{text}
+
+Using only this summary, answer the question clearly and completely.
+QUESTION: {question}
+
+ANSWER:"""
+
+# Tokens kept free for the prompt template around the text
+PROMPT_OVERHEAD_TOKENS = 120
+
+def is_whole_document_question(question: str) -> bool:
+    """Whether a question asks about the document as a whole (summary, overview, main points)"""
+    return bool(WHOLE_DOCUMENT_PATTERN.search(question or ""))
+
+def document_key(chunks: List[str], chunk_metadata: List[dict] = None) -> str:
+    """Cache key for a document: its ingest document_id, else a fingerprint of the chunks"""
+    document_ids = sorted({meta['document_id'] for meta in chunk_metadata or [] if meta.get('document_id')})
+    return ",".join(document_ids) if document_ids else document_fingerprint(chunks)
+
+def document_segments(chunks: List[str], chunk_metadata: List[dict] = None) -> List[str]:
+    """Chunk texts in document order with the overlap between neighbours removed"""
+    chunk_metadata = chunk_metadata or [{}] * len(chunks)
+    if not all('start_word' in meta for meta in chunk_metadata):
+        return list(chunks)
+    segments, covered = [], 0
+    for chunk, meta in sorted(zip(chunks, chunk_metadata), key=lambda item: item[1]['start_word']):
+        # Chunks are space-joined word tokens, so offsets index directly into split(' ')
+        tokens = chunk.split(' ')[max(0, covered - meta['start_word']):]
+        if tokens:
+            segments.append(' '.join(tokens))
+        covered = max(covered, meta['end_word'])
+    return segments
+
+def group_by_tokens(texts: List[str], budget: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """Join consecutive texts into groups of at most budget tokens (oversized texts are truncated)"""
+    groups, current, used = [], [], 0
+    for text in texts:
+        cost = count_tokens(text) + 2
+        if cost > budget:
+            text, cost = truncate_to_tokens(text, budget - 2, count_tokens), budget
+        if current and used + cost > budget:
+            groups.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(text)
+        used += cost
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+class SummaryCache:
+    """Map and reduce outputs per document, keyed by model and prompt"""
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.SUMMARY_CACHE_DB
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, document TEXT NOT NULL, "
+                             "summary TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS summaries_document ON summaries (document)")
+
+    @staticmethod
+    def key(model_name: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{prompt}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, document: str, summary: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                             (key, document, summary, time.time()))
+
+    def clear(self, document: str = None):
+        with self._lock, self._db:
+            if document is None:
+                self._db.execute("DELETE FROM summaries")
+            else:
+                self._db.execute("DELETE FROM summaries WHERE document = ?", (document,))
+
+class MapReduceSummarizer:
+    """Answer a question about a whole document with map-reduce over an LLM.
+
+    generate(prompt) -> text is the backend call; it should raise on errors
+    so failed summaries are not cached.
+    """
+
+    def __init__(self, generate: Callable[[str], str], model_name: str, count_tokens: Callable[[str], int] = None,
+                 cache: SummaryCache = None, parallelism: int = None):
+        self.generate = generate
+        self.model_name = model_name
+        self.count_tokens = count_tokens or estimate_tokens
+        self.cache = cache or get_summary_cache()
+        self.parallelism = max(1, parallelism or Config.SUMMARY_PARALLELISM)
+        self.budget = Config.LLM_CONTEXT_WINDOW - Config.LLM_MAX_ANSWER_TOKENS - PROMPT_OVERHEAD_TOKENS
+        self.stats = {'llm_calls': 0, 'cached': 0, 'levels': 0}
+
+    def _summarize(self, template: str, text: str, document: str) -> Tuple[str, bool]:
+        """Summary of one group and whether it came from the cache"""
+        prompt = template.format(text=text)
+        key = SummaryCache.key(self.model_name, prompt)
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary, True
+        summary = self.generate(prompt).strip()
+        self.cache.put(key, document, summary)
+        return summary, False
+
+    def _summarize_all(self, template: str, groups: List[str], document: str, stage: str) -> List[str]:
+        with span(stage), ThreadPoolExecutor(max_workers=min(self.parallelism, len(groups))) as executor:
+            # Each call runs in a copy of the caller's context so LLM timings land on its trace
+            futures = [executor.submit(contextvars.copy_context().run, self._summarize, template, group, document)
+                       for group in groups]
+            results = [future.result() for future in futures]
+        # Counted here rather than in the workers, which run concurrently
+        cached = sum(1 for _, hit in results if hit)
+        self.stats['cached'] += cached
+        self.stats['llm_calls'] += len(results) - cached
+        return [summary for summary, _ in results]
+
+    def answer(self, question: str, chunks: List[str], chunk_metadata: List[dict] = None) -> str:
+        document = document_key(chunks, chunk_metadata)
+        groups = group_by_tokens(document_segments(chunks, chunk_metadata), self.budget, self.count_tokens)
+        summaries = self._summarize_all(MAP_PROMPT, groups, document, 'summary_map') if len(groups) > 1 else groups
+
+        # Reduce level by level until everything fits in the answer prompt
+        while sum(self.count_tokens(summary) + 2 for summary in summaries) > self.budget:
+            groups = group_by_tokens(summaries, self.budget, self.count_tokens)
+            if len(groups) >= len(summaries):
+                # Every summary fills a group on its own; halve them instead of looping
+                groups = [truncate_to_tokens(summary, self.budget // 2, self.count_tokens) for summary in summaries]
+                groups = group_by_tokens(groups, self.budget, self.count_tokens)
+            summaries = self._summarize_all(REDUCE_PROMPT, groups, document, 'summary_reduce')
+            self.stats['levels'] += 1
+
+        with span('summary_answer'):
+            answer = self.generate(ANSWER_PROMPT.format(text="\n\n".join(summaries), question=question)).strip()
+        self.stats['llm_calls'] += 1
+        print(f"Map-reduce answer: {self.stats['llm_calls']} LLM calls, {self.stats['cached']} cached summaries, "
+              f"{self.stats['levels']} reduce levels")
+        return answer
+
+_cache: Optional[SummaryCache] = None
+_cache_lock = threading.Lock()
+
+def get_summary_cache() -> SummaryCache:
+    """Process-wide summary cache, created on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SummaryCache()
+    return _cache
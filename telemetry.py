@@ -0,0 +1,195 @@
+"""
+Lightweight tracing and metrics for Intelligent RAG Assistant
+Author: Sreevallabh kakarala
+Version: 2.0
+
+span("name") times a pipeline stage. Every span feeds a process-wide
+latency histogram, and when it runs inside trace() it is also recorded on
+that trace, giving a per-question (or per-ingest) timing breakdown.
+Histograms export as Prometheus text (prometheus_text, GET /metrics on the
+API) or as a JSON file (METRICS_JSON_PATH, written after every trace).
+
+Spans used across the pipeline:
+    extraction, ocr_page, chunking, metadata, embedding, index_build,
+    query_embedding, faiss_search, rerank, prompt_build, llm_ttft, llm_total
+"""
+
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from config import Config
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+class Histogram:
+    """Cumulative-bucket latency histogram, Prometheus style"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: the upper bound of the bucket holding it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        for bound, total in zip(self.buckets, self.cumulative()):
+            if total >= rank:
+                return bound if bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+class MetricsRegistry:
+    """Span-duration histograms keyed by span name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+
+    def prometheus_text(self) -> str:
+        """Histograms in the Prometheus text exposition format"""
+        metric = "rag_span_duration_seconds"
+        lines = [f"# HELP {metric} Duration of RAG pipeline stages",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self.histograms.items()):
+                for bound, total in zip(histogram.buckets, histogram.cumulative()):
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{le}"}} {total}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'{metric}_count{{span="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    'count': histogram.count,
+                    'mean_ms': round(histogram.sum * 1000 / histogram.count, 3) if histogram.count else 0.0,
+                    'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+                    'p95_ms': round(histogram.quantile(0.95) * 1000, 3),
+                    'buckets': {("+Inf" if bound == math.inf else str(bound)): total
+                                for bound, total in zip(histogram.buckets, histogram.cumulative())},
+                }
+                for name, histogram in sorted(self.histograms.items())
+            }
+
+    def write_json(self, path: str):
+        """Write the histograms to a JSON file (atomically replaced)"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'generated_at': time.time(), 'spans': self.to_dict()}, f, indent=2)
+        os.replace(temp_path, path)
+
+registry = MetricsRegistry()
+
+class Trace:
+    """Spans recorded while one question or ingest was processed"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Tuple[str, float]] = []
+        self.total_ms = 0.0
+
+    def add(self, name: str, ms: float):
+        self.spans.append((name, ms))
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds per span name, in first-seen order"""
+        totals: Dict[str, float] = {}
+        for name, ms in self.spans:
+            totals[name] = totals.get(name, 0.0) + ms
+        return {name: round(ms, 1) for name, ms in totals.items()}
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('rag_trace', default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+def observe(name: str, seconds: float):
+    """Record a measurement taken outside a span (e.g. time to first token)"""
+    if not Config.TELEMETRY_ENABLED:
+        return
+    registry.observe(name, seconds)
+    active = _current_trace.get()
+    if active is not None:
+        active.add(name, seconds * 1000)
+
+@contextmanager
+def span(name: str):
+    """Time a pipeline stage"""
+    if not Config.TELEMETRY_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+def traced(name: str):
+    """Decorator form of span()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def trace(name: str):
+    """Collect the spans of one question/ingest into a Trace"""
+    active = Trace(name)
+    token = _current_trace.set(active)
+    started = time.perf_counter()
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+        active.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        if Config.TELEMETRY_ENABLED:
+            registry.observe(name, active.total_ms / 1000)
+            if Config.METRICS_JSON_PATH:
+                try:
+                    registry.write_json(Config.METRICS_JSON_PATH)
+                except OSError as e:
+                    print(f"Could not write metrics to {Config.METRICS_JSON_PATH}: {e}")
+
+def prometheus_text() -> str:
+    return registry.prometheus_text()
@@ -1,65 +1,397 @@
-import faiss
+import hashlib
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import os
 import pickle
-from typing import List, Tuple
+import shutil
+import threading
+from bisect import bisect_right
+import time
+from typing import List, NamedTuple, Optional, Tuple
 import re
 
+from config import Config
+from chunk_dedupe import dedupe_chunks
+from embedding_batcher import EmbeddingBatcher
+from embedding_pool import get_embedding_pool, length_sorted_batches, padding_report, token_lengths
+from lazy_imports import lazy_import
+from query_cache import LRUCache, normalize_query
+from search_filter import MetadataColumns, SearchFilter, search_params
+from section_index import SectionIndex
+from mmr import mmr_select
+from memory_report import mapped_memory, process_memory
+from sharded_index import ShardedIndex, index_files, is_sharded, read_index, write_index
+from snapshots import SnapshotError, current_version, verify_snapshot, write_snapshot
+from telemetry import span, traced
+
+# faiss and sentence-transformers (torch) are only imported on first use
+faiss = lazy_import('faiss')
+sentence_transformers = lazy_import('sentence_transformers')
+
+# Embedding models are shared across stores so re-uploads don't reload weights
+_models = {}
+_models_lock = threading.Lock()
+_query_batchers = {}
+_warmup_thread = None
+
+def get_embedding_model(embedding_model_name: str = 'all-MiniLM-L6-v2', backend: str = None):
+    """Load (once per process) and return the embedding model.
+
+    backend is 'torch' (SentenceTransformer), 'onnx' or 'onnx-int8' (ONNX
+    Runtime, see onnx_embedder); it defaults to Config.EMBEDDING_BACKEND.
+    """
+    backend = backend or Config.EMBEDDING_BACKEND
+    key = (embedding_model_name, backend)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                if backend in ('onnx', 'onnx-int8'):
+                    from onnx_embedder import OnnxEmbedder
+                    model = OnnxEmbedder(embedding_model_name, quantize=backend == 'onnx-int8')
+                else:
+                    model = sentence_transformers.SentenceTransformer(embedding_model_name)
+                _models[key] = model
+    return model
+
+def get_query_batcher(embedding_model_name: str = 'all-MiniLM-L6-v2') -> EmbeddingBatcher:
+    """Shared micro-batcher for single-query encodes against one model"""
+    batcher = _query_batchers.get(embedding_model_name)
+    if batcher is None:
+        # get_embedding_model takes _models_lock itself, so load the model before taking it here
+        model = get_embedding_model(embedding_model_name)
+        with _models_lock:
+            batcher = _query_batchers.get(embedding_model_name)
+            if batcher is None:
+                batcher = EmbeddingBatcher(
+                    lambda texts: model.encode(texts, convert_to_numpy=True, normalize_embeddings=True),
+                    max_batch_size=Config.QUERY_BATCH_SIZE,
+                    max_delay_ms=Config.QUERY_BATCH_MAX_DELAY_MS,
+                    name=f"query-batcher-{embedding_model_name}"
+                )
+                _query_batchers[embedding_model_name] = batcher
+    return batcher
+
+def query_batcher_metrics(embedding_model_name: str = 'all-MiniLM-L6-v2'):
+    """Metrics of the model's query batcher, or None if it hasn't been used"""
+    batcher = _query_batchers.get(embedding_model_name)
+    return batcher.metrics() if batcher is not None else None
+
+def warm_up(embedding_model_name: str = 'all-MiniLM-L6-v2', background: bool = True):
+    """Preload faiss and the embedding model and run a dummy encode.
+
+    With background=True this runs in a daemon thread and returns it, so the
+    caller (e.g. the Streamlit script) can keep rendering. Repeated calls reuse
+    the same thread.
+    """
+    global _warmup_thread
+
+    def _run():
+        try:
+            faiss.IndexFlatIP  # Force the faiss import
+            model = get_embedding_model(embedding_model_name)
+            model.encode(["warm up"], convert_to_numpy=True, normalize_embeddings=True)
+            print(f"Warm-up complete for embedding model: {embedding_model_name}")
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+
+    if not background:
+        _run()
+        return None
+
+    with _models_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_run, name="embedding-warmup", daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+def stored_version(index_path: str = None, snapshot_dir: str = None):
+    """What a store's load() would pick up now: the current snapshot name, else the index file's mtime"""
+    snapshot_dir = Config.SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+    version = current_version(snapshot_dir) if snapshot_dir else None
+    if version is None:
+        try:
+            return os.path.getmtime(index_path or Config.INDEX_PATH)
+        except OSError:
+            return None
+    return version
+
+def _close_index(index):
+    """Release an index's search threads (ShardedIndex) once it is swapped out"""
+    close = getattr(index, 'close', None)
+    if close is not None:
+        close()
+
+def document_fingerprint(chunks: List[str]) -> str:
+    """Stable ID of a document's content, used as chunk_metadata['document_id']"""
+    digest = hashlib.blake2b(digest_size=8)
+    for chunk in chunks:
+        digest.update(chunk.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class _IndexView(NamedTuple):
+    index: object
+    chunks: List[str]
+    chunk_metadata: List[dict]
+    version: int
+    sections: Optional[SectionIndex] = None
+
 class EnhancedVectorStore:
-    def __init__(self, embedding_model_name='all-MiniLM-L6-v2', index_path='faiss.index', mapping_path='chunks.pkl'):
-        self.model = SentenceTransformer(embedding_model_name)
+    def __init__(self, embedding_model_name='all-MiniLM-L6-v2', index_path='faiss.index', mapping_path='chunks.pkl',
+                 snapshot_dir: str = None):
+        self.embedding_model_name = embedding_model_name
+        self._model = None
         self.index_path = index_path
         self.mapping_path = mapping_path
         self.metadata_path = 'chunk_metadata.pkl'
+        self.sections_path = 'chunk_sections.npz'
+        # Versioned snapshots (see snapshots); falsy keeps the in-place files above
+        self.snapshot_dir = Config.SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+        self.snapshot_version = None
+        self._loaded_index_path = None
+        # Guards swapping index, chunks and metadata together; searches read them as one view
+        self._swap_lock = threading.Lock()
+        self._columns = None  # MetadataColumns for search filters, rebuilt per index version
         self.index = None
+        self.sections = None  # SectionIndex for hierarchical search, if built
         self.chunks = []
         self.chunk_metadata = []
         self.embeddings = None
+        self.embedding_report = None
+        self.dedupe_report = None
+        self.load_report = None
 
+        # Query embeddings survive index changes; ranked results do not
+        self.index_version = 0
+        self.embedding_cache = LRUCache(Config.QUERY_CACHE_SIZE)
+        self.result_cache = LRUCache(Config.RESULT_CACHE_SIZE)
+
+    @property
+    def model(self):
+        """Embedding model, loaded on first use"""
+        if self._model is None:
+            self._model = get_embedding_model(self.embedding_model_name)
+        return self._model
+
+    @traced('embedding')
     def embed_chunks(self, chunks: List[str]) -> np.ndarray:
-        """Enhanced embedding with better normalization"""
+        """Enhanced embedding with better normalization.
+
+        Chunks are bucketed by token length so each batch pads to similar
+        lengths, and rows are returned in the original order. Large ingests
+        are sharded across a process pool when EMBEDDING_WORKERS > 1 (see
+        embedding_pool). The padding of each batch is kept in
+        self.embedding_report.
+        """
         print("Creating embeddings for document chunks...")
-        embeddings = self.model.encode(
-            chunks, 
-            show_progress_bar=True, 
-            convert_to_numpy=True, 
-            normalize_embeddings=True,
-            batch_size=32  # Process in batches for efficiency
-        )
+        if not chunks:
+            self.embeddings = np.zeros((0, Config.VECTOR_DIMENSIONS), dtype=np.float32)
+            return self.embeddings
+
+        batch_size = Config.EMBEDDING_BATCH_SIZE
+        lengths = token_lengths(self.model, chunks)
+        batches = length_sorted_batches(chunks, batch_size, lengths=lengths)
+        self.embedding_report = padding_report(batches, lengths, batch_size)
+
+        if Config.EMBEDDING_WORKERS > 1 and len(chunks) >= Config.EMBEDDING_POOL_MIN_CHUNKS:
+            embeddings = get_embedding_pool(self.embedding_model_name).encode_batches(chunks, batches)
+        else:
+            embeddings = None
+            for batch in batches:
+                batch_embeddings = self.model.encode(
+                    [chunks[i] for i in batch],
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    batch_size=len(batch)
+                )
+                if embeddings is None:
+                    embeddings = np.empty((len(chunks), batch_embeddings.shape[1]), dtype=np.float32)
+                embeddings[batch] = batch_embeddings
+
+        report = self.embedding_report
+        print(f"Embedded {len(chunks)} chunks in {len(batches)} length-sorted batches: "
+              f"padding {report['padding_ratio']:.1%} (vs {report['unsorted_padding_ratio']:.1%} unsorted, "
+              f"{report['padded_token_savings']:.1%} fewer padded tokens)")
         self.embeddings = embeddings
         return embeddings
 
+    @traced('index_build')
     def build_faiss_index(self, embeddings: np.ndarray):
         """Build FAISS index with better configuration"""
         dim = embeddings.shape[1]
-        # Use IndexFlatIP for cosine similarity (with normalized vectors)
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(embeddings)
+        _close_index(self.index)
+        if Config.INDEX_SHARDS > 1:
+            # Flat IP shards searched in parallel (see sharded_index)
+            self.index = ShardedIndex(dim, Config.INDEX_SHARDS)
+            self.index.add_with_ids(embeddings, np.arange(len(embeddings)))
+        else:
+            # Use IndexFlatIP for cosine similarity (with normalized vectors)
+            self.index = faiss.IndexFlatIP(dim)
+            self.index.add(embeddings)
+        self._index_changed()
         print(f"Built FAISS index with {embeddings.shape[0]} chunks")
 
-    def save(self, chunks: List[str]):
-        """Save index and metadata"""
-        if self.index is not None:
-            faiss.write_index(self.index, self.index_path)
-        with open(self.mapping_path, 'wb') as f:
+    def _index_changed(self):
+        """Invalidate cached search results after any index mutation"""
+        self.index_version += 1
+        self.result_cache.clear()
+
+    def save(self, chunks: List[str] = None):
+        """Save index, chunks (default: self.chunks) and metadata.
+
+        With a snapshot_dir they are written as a new snapshot that becomes
+        current atomically; readers never see an index from one save and
+        chunks from another. Otherwise the files are replaced in place, the
+        index by rename so processes that mapped the old one keep working.
+        """
+        chunks = self.chunks if chunks is None else chunks
+        if self.snapshot_dir:
+            self.snapshot_version = write_snapshot(self.snapshot_dir, lambda directory: self._write_files(
+                chunks, os.path.join(directory, 'faiss.index'), os.path.join(directory, 'chunks.pkl'),
+                os.path.join(directory, 'chunk_metadata.pkl'), os.path.join(directory, 'chunk_sections.npz')),
+                manifest={
+                    'embedding_model': self.embedding_model_name,
+                    'dim': self.index.d if self.index is not None else None,
+                    'chunks': len(chunks),
+                    'sharded': isinstance(self.index, ShardedIndex),
+                })
+            self._loaded_index_path = os.path.join(self.snapshot_dir, self.snapshot_version, 'faiss.index')
+            print(f"Saved index snapshot {self.snapshot_version}")
+        else:
+            self._write_files(chunks, self.index_path, self.mapping_path, self.metadata_path, self.sections_path)
+
+    def _write_files(self, chunks: List[str], index_path: str, mapping_path: str, metadata_path: str,
+                     sections_path: str):
+        # A sharded index is saved as a directory at index_path
+        if isinstance(self.index, ShardedIndex):
+            if os.path.isfile(index_path):
+                os.remove(index_path)
+            self.index.save(index_path)
+        elif self.index is not None:
+            if os.path.isdir(index_path):
+                shutil.rmtree(index_path)
+            # Never overwritten in place: other processes may have it memory-mapped
+            write_index(self.index, index_path)
+        with open(mapping_path, 'wb') as f:
             pickle.dump(chunks, f)
-        with open(self.metadata_path, 'wb') as f:
+        with open(metadata_path, 'wb') as f:
             pickle.dump(self.chunk_metadata, f)
+        if self.sections is not None:
+            self.sections.save(sections_path)
+        elif os.path.exists(sections_path):
+            os.remove(sections_path)
+
+    def load(self, mmap: bool = False, shard_ids: List[int] = None, version: str = None):
+        """Load index and metadata from the current snapshot (or the given version).
+
+        Falls back to the in-place files when no snapshot exists. Everything
+        is read first and swapped in together, so searches already running
+        finish on the previous data. With mmap=True the index is opened
+        read-only and memory-mapped where the index type supports it, so
+        several processes share its pages. For a sharded index, shard_ids
+        restricts loading to those shards.
+        """
+        started = time.perf_counter()
+        version = version or (current_version(self.snapshot_dir) if self.snapshot_dir else None)
+        if version is not None:
+            manifest = verify_snapshot(self.snapshot_dir, version, checksums=Config.SNAPSHOT_VERIFY_CHECKSUMS)
+            if manifest.get('embedding_model') not in (None, self.embedding_model_name):
+                raise SnapshotError(f"Snapshot {version} was embedded with {manifest['embedding_model']}, "
+                                    f"not {self.embedding_model_name}")
+            directory = os.path.join(self.snapshot_dir, version)
+            index_path = os.path.join(directory, 'faiss.index')
+            mapping_path = os.path.join(directory, 'chunks.pkl')
+            metadata_path = os.path.join(directory, 'chunk_metadata.pkl')
+            sections_path = os.path.join(directory, 'chunk_sections.npz')
+        else:
+            index_path, mapping_path, metadata_path = self.index_path, self.mapping_path, self.metadata_path
+            sections_path = self.sections_path
+
+        index, chunks, chunk_metadata = self.index, self.chunks, self.chunk_metadata
+        # Indexes saved without sections are searched flat
+        sections = SectionIndex.load(sections_path) if os.path.exists(sections_path) else None
+        if is_sharded(index_path):
+            index = ShardedIndex.load(index_path, shard_ids=shard_ids, mmap=mmap)
+        elif os.path.isfile(index_path):
+            index = read_index(index_path, mmap=mmap)
+        if os.path.exists(mapping_path):
+            with open(mapping_path, 'rb') as f:
+                chunks = pickle.load(f)
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'rb') as f:
+                chunk_metadata = pickle.load(f)
+        # Every index ID must map to a chunk and its metadata; searches rely on it
+        expected = manifest.get('chunks', len(chunks)) if version is not None else len(chunks)
+        if index is not None and (len(chunks) != expected or len(chunk_metadata) != expected or
+                                  (shard_ids is None and index.ntotal != expected)):
+            raise SnapshotError(f"Index at {index_path} is inconsistent: {index.ntotal} vectors, "
+                                f"{len(chunks)} chunks, {len(chunk_metadata)} metadata entries")
+
+        if sections is not None and len(sections.chunk_sections) != len(chunks):
+            print(f"Ignoring section index at {sections_path}: built for a different chunk list")
+            sections = None
+
+        with self._swap_lock:
+            if index is not self.index:
+                _close_index(self.index)
+            self.index, self.chunks, self.chunk_metadata, self.sections = index, chunks, chunk_metadata, sections
+            self.snapshot_version = version
+            self._loaded_index_path = index_path
+            self._index_changed()
+
+        self.load_report = {'mmap': mmap, 'load_ms': round((time.perf_counter() - started) * 1000, 1),
+                            'snapshot': version}
+        report = self.memory_report()
+        if report['index_mb'] and report['mapped_mb'] is not None:
+            print(f"Loaded index ({report['index_mb']:.1f} MB) in {report['load_ms']:.0f} ms: "
+                  f"{report['mapped_mb']:.1f} MB mapped, {report['mapped_resident_mb']:.1f} MB of it resident; "
+                  f"process private memory {report['private_mb']:.1f} MB")
 
-    def load(self):
-        """Load index and metadata"""
-        if os.path.exists(self.index_path):
-            self.index = faiss.read_index(self.index_path)
-        if os.path.exists(self.mapping_path):
-            with open(self.mapping_path, 'rb') as f:
-                self.chunks = pickle.load(f)
-        if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, 'rb') as f:
-                self.chunk_metadata = pickle.load(f)
-
-    def create_chunk_metadata(self, chunks: List[str]):
-        """Create metadata for each chunk for better retrieval"""
+    def reload_if_changed(self, mmap: bool = False) -> bool:
+        """Load the current snapshot if another process or session saved a newer one"""
+        version = current_version(self.snapshot_dir) if self.snapshot_dir else None
+        if version is None or version == self.snapshot_version:
+            return False
+        self.load(mmap=mmap, version=version)
+        return True
+
+    def close(self):
+        """Release the index's search threads; call when the store is replaced"""
+        _close_index(self.index)
+
+    def memory_report(self) -> dict:
+        """Index size on disk versus what this process maps and holds privately (MB)"""
+        files = index_files(self._loaded_index_path or self.index_path)
+        mapped = mapped_memory(files)
+        process = process_memory()
+
+        def mb(kb):
+            return round(kb / 1024, 1) if kb is not None else None
+
+        return {
+            **(self.load_report or {}),
+            'index_mb': round(sum(os.path.getsize(path) for path in files) / 2**20, 1),
+            'mapped_mb': mb(mapped['mapped_kb']),
+            'mapped_resident_mb': mb(mapped['mapped_resident_kb']),
+            'process_rss_mb': mb(process['rss_kb']),
+            'private_mb': mb(process['rss_anon_kb']),
+            'file_backed_mb': mb(process['rss_file_kb']),
+        }
+
+    @traced('metadata')
+    def create_chunk_metadata(self, chunks: List[str], offsets: List[Tuple[int, int]] = None,
+                              page_starts: List[int] = None, document_id: str = None):
+        """Create metadata for each chunk for better retrieval.
+
+        offsets are optional (start_word, end_word) positions of each chunk in
+        the source text, used to merge overlapping chunks at prompt time.
+        page_starts (word position where each page begins, see
+        pdf_utils.page_word_starts) adds the chunk's page range. Every chunk
+        gets document_id, by default a hash of the document's chunks.
+        """
+        document_id = document_id or document_fingerprint(chunks)
         metadata = []
         for i, chunk in enumerate(chunks):
             # Analyze chunk content
@@ -75,8 +407,9 @@ class EnhancedVectorStore:
             unique_words = len(set(chunk.lower().split()))
             richness_score = unique_words / max(word_count, 1)
             
-            metadata.append({
+            chunk_meta = {
                 'chunk_id': i,
+                'document_id': document_id,
                 'word_count': word_count,
                 'has_numbers': has_numbers,
                 'has_dates': has_dates,
@@ -84,31 +417,184 @@ class EnhancedVectorStore:
                 'has_names': has_names,
                 'richness_score': richness_score,
                 'chunk_preview': chunk[:100] + "..." if len(chunk) > 100 else chunk
-            })
+            }
+            if offsets is not None:
+                chunk_meta['start_word'], chunk_meta['end_word'] = offsets[i]
+                if page_starts:
+                    chunk_meta['page_start'] = bisect_right(page_starts, offsets[i][0])
+                    chunk_meta['page_end'] = bisect_right(page_starts, max(offsets[i][1] - 1, offsets[i][0]))
+            metadata.append(chunk_meta)
         
         self.chunk_metadata = metadata
         return metadata
 
-    def add_chunks(self, chunks: List[str]):
-        """Add chunks with enhanced processing"""
+    def add_chunks(self, chunks: List[str], offsets: List[Tuple[int, int]] = None, page_starts: List[int] = None,
+                   document_id: str = None):
+        """Add chunks with enhanced processing.
+
+        With DEDUPE_CHUNKS, duplicate and near-duplicate chunks are dropped
+        before embedding; self.chunks then holds only the kept chunks.
+        """
+        self.create_chunk_metadata(chunks, offsets, page_starts, document_id)
+        if Config.DEDUPE_CHUNKS and len(chunks) > 1:
+            chunks = self.remove_duplicate_chunks(chunks)
         self.chunks = chunks
-        self.create_chunk_metadata(chunks)
         embeddings = self.embed_chunks(chunks)
         self.build_faiss_index(embeddings)
+        self.build_section_index(embeddings)
+
+    @traced('index_build')
+    def build_section_index(self, embeddings: np.ndarray):
+        """Mean-pooled section vectors over the chunk index (see section_index)"""
+        self.sections = SectionIndex.build(embeddings, self.chunk_metadata, Config.SECTION_SIZE) \
+            if len(embeddings) else None
+
+    @traced('dedupe')
+    def remove_duplicate_chunks(self, chunks: List[str]) -> List[str]:
+        """Keep one chunk per duplicate group; the removed copies are listed in its metadata.
+
+        Each kept chunk's metadata gets 'source_chunk_id' (its position in
+        the input) and, if it absorbed copies, 'duplicates' with their
+        input chunk_id, word offsets and pages.
+        """
+        result = dedupe_chunks(chunks)
+        self.dedupe_report = result.report()
+        metadata = []
+        for new_id, position in enumerate(result.keep):
+            chunk_meta = dict(self.chunk_metadata[position], chunk_id=new_id, source_chunk_id=position)
+            if position in result.duplicates:
+                chunk_meta['duplicates'] = [
+                    {key: self.chunk_metadata[duplicate][key]
+                     for key in ('chunk_id', 'start_word', 'end_word', 'page_start', 'page_end')
+                     if key in self.chunk_metadata[duplicate]}
+                    for duplicate in result.duplicates[position]
+                ]
+            metadata.append(chunk_meta)
+        self.chunk_metadata = metadata
+
+        removed = len(chunks) - len(result.keep)
+        if removed:
+            print(f"Removed {removed} duplicate chunks ({result.exact_duplicates} exact, "
+                  f"{result.near_duplicates} near) of {len(chunks)}")
+        return [chunks[position] for position in result.keep]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed one or more queries with the store's model"""
+        return self.model.encode(queries, convert_to_numpy=True, normalize_embeddings=True)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a single query, from the LRU cache or batched with concurrent callers"""
+        key = normalize_query(query)
+        query_emb = self.embedding_cache.get(key)
+        if query_emb is None:
+            with span('query_embedding'):
+                if Config.QUERY_BATCHING:
+                    query_emb = get_query_batcher(self.embedding_model_name).encode(key)
+                else:
+                    query_emb = self.encode_queries([key])
+            self.embedding_cache.put(key, query_emb)
+        return query_emb
+
+    def enhanced_search(self, query: str, top_k: int = 5, query_emb: np.ndarray = None,
+                        search_filter: SearchFilter = None) -> List[Tuple[str, float, dict]]:
+        """Enhanced search with re-ranking and metadata.
+
+        query_emb may be passed when the query was already embedded (e.g. as
+        part of a batch); it must have shape (1, dim). search_filter limits
+        the search to matching chunks inside the FAISS scan (see
+        search_filter). Ranked results are cached per index version and
+        filter.
+        """
+        view = self._view()
+        cache_key = (view.version, normalize_query(query), top_k, search_filter)
+        ranked = self.result_cache.get(cache_key)
+        if ranked is None:
+            ranked = self._rank(view, query, top_k, query_emb, search_filter)
+            self.result_cache.put(cache_key, ranked)
+        
+        return [(view.chunks[idx], score, view.chunk_metadata[idx]) for idx, score in ranked]
+
+    def _view(self) -> '_IndexView':
+        """Index, chunks and metadata of one load, unaffected by a reload mid-search"""
+        with self._swap_lock:
+            return _IndexView(self.index, self.chunks, self.chunk_metadata, self.index_version, self.sections)
+
+    def _filter_mask(self, view: '_IndexView', search_filter: SearchFilter) -> np.ndarray:
+        columns = self._columns
+        if columns is None or columns.version != view.version:
+            columns = MetadataColumns(view.chunk_metadata, view.version)
+            self._columns = columns
+        return columns.mask(search_filter)
+
+    def _rank(self, view: '_IndexView', query: str, top_k: int, query_emb: np.ndarray = None,
+              search_filter: SearchFilter = None) -> List[Tuple[int, float]]:
+        """Top chunk IDs and re-ranked scores for a query, diversified with MMR.
+
+        Large indexes are searched hierarchically: the best sections first,
+        then only their chunks.
+        """
+        diversify = Config.MMR_LAMBDA < 1.0
+        candidates = min(top_k * (Config.MMR_CANDIDATE_FACTOR if diversify else 2), len(view.chunks))  # Get more candidates
+        mask = None
+        if search_filter is not None and search_filter.restricts:
+            mask = self._filter_mask(view, search_filter)
+            if not mask.any():
+                return []
 
-    def enhanced_search(self, query: str, top_k: int = 5) -> List[Tuple[str, float, dict]]:
-        """Enhanced search with re-ranking and metadata"""
         # Initial semantic search
-        query_emb = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
-        D, I = self.index.search(query_emb, min(top_k * 2, len(self.chunks)))  # Get more candidates
+        if query_emb is None:
+            query_emb = self.encode_query(query)
+        if self._hierarchical(view):
+            with span('section_search'):
+                mask = view.sections.chunk_mask(query_emb, Config.SECTION_TOP_K, allowed=mask)
+        params = None
+        if mask is not None:
+            candidates = min(candidates, int(mask.sum()))
+            if candidates == 0:
+                return []
+            params = search_params(mask)
+        with span('faiss_search'):
+            if params is not None:
+                D, I = view.index.search(query_emb, candidates, params=params)
+            else:
+                D, I = view.index.search(query_emb, candidates)
         
+        with span('rerank'):
+            ranked = self._rerank(view, query, I[0], D[0], search_filter)
+        if not diversify or len(ranked) <= 1:
+            return ranked[:top_k]
+        with span('mmr'):
+            return self._diversify(view, ranked, top_k)
+
+    @staticmethod
+    def _hierarchical(view: '_IndexView') -> bool:
+        """Whether the index is large enough for a section-first search to pay off"""
+        return (Config.HIERARCHICAL_SEARCH and view.sections is not None
+                and len(view.chunks) >= Config.HIERARCHICAL_MIN_CHUNKS
+                and view.sections.num_sections > Config.SECTION_TOP_K)
+
+    def _diversify(self, view: '_IndexView', ranked: List[Tuple[int, float]], top_k: int) -> List[Tuple[int, float]]:
+        """Re-select top_k of the re-ranked shortlist with MMR, using the vectors stored in the index"""
+        try:
+            embeddings = view.index.reconstruct_batch(np.array([idx for idx, score in ranked], dtype=np.int64))
+        except (RuntimeError, KeyError) as e:
+            # Index types without stored vectors keep the plain ranking
+            print(f"MMR skipped, index vectors unavailable: {e}")
+            return ranked[:top_k]
+        order = mmr_select(np.array([score for idx, score in ranked]), embeddings, top_k,
+                           Config.MMR_LAMBDA, Config.MMR_DUPLICATE_THRESHOLD)
+        return [ranked[position] for position in order]
+
+    def _rerank(self, view: '_IndexView', query: str, ids, scores,
+                search_filter: SearchFilter = None) -> List[Tuple[int, float]]:
+        """Boost semantic scores with keyword and metadata signals"""
         results = []
         query_lower = query.lower()
         
-        for idx, score in zip(I[0], D[0]):
-            if idx < len(self.chunks):
-                chunk = self.chunks[idx]
-                metadata = self.chunk_metadata[idx] if idx < len(self.chunk_metadata) else {}
+        for idx, score in zip(ids, scores):
+            if idx >= 0:  # faiss pads missing hits with -1
+                chunk = view.chunks[idx]
+                metadata = view.chunk_metadata[idx]
                 
                 # Enhanced scoring with multiple factors
                 final_score = float(score)
@@ -133,11 +619,22 @@ class EnhancedVectorStore:
                 # Boost for content richness
                 final_score += metadata.get('richness_score', 0) * 0.02
                 
-                results.append((chunk, final_score, metadata))
+                if search_filter is not None:
+                    final_score += search_filter.boost(metadata)
+                
+                results.append((int(idx), final_score))
         
-        # Sort by enhanced score and return top_k
+        # Sort by enhanced score
         results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+        return results
+
+    def cache_stats(self) -> dict:
+        """Hit ratios of the query embedding and search result caches"""
+        return {
+            'index_version': self.index_version,
+            'embeddings': self.embedding_cache.stats(),
+            'results': self.result_cache.stats(),
+        }
 
     def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
         """Backward compatible search method"""
@@ -157,14 +654,18 @@ class EnhancedVectorStore:
         chunks_with_dates = sum(1 for meta in self.chunk_metadata if meta.get('has_dates', False))
         chunks_with_money = sum(1 for meta in self.chunk_metadata if meta.get('has_money', False))
         
+        document_ids = sorted({str(meta['document_id']) for meta in self.chunk_metadata if 'document_id' in meta})
         return {
+            "document_ids": document_ids,
             "total_chunks": len(self.chunks),
             "total_words": total_words,
             "avg_chunk_size": round(avg_chunk_size),
             "chunks_with_numbers": chunks_with_numbers,
             "chunks_with_dates": chunks_with_dates,
             "chunks_with_money": chunks_with_money,
-            "document_preview": self.chunks[0][:200] + "..." if self.chunks else ""
+            "document_preview": self.chunks[0][:200] + "..." if self.chunks else "",
+            "duplicate_chunks_removed": (self.dedupe_report['input_chunks'] - self.dedupe_report['kept_chunks']
+                                         if self.dedupe_report else 0)
         }
 
 # Backward compatibility